@@ -1,12 +1,28 @@
+import argparse
 import base64
+import collections
+import cProfile
 import datetime
+import functools
 import hashlib
+import heapq
+import itertools
 import json
+import math
 import os
+import pstats
 import re
-from typing import List
+import socket
+import sys
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager, nullcontext
+from typing import Iterator, List, NamedTuple
 import random
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 ACCESS_TOKEN = os.environ.get('ACCESS_TOKEN')
@@ -20,11 +36,168 @@ NOTION_HEADERS = {
     'Content-Type': 'application/json',
 }
 NOTION_PAGE_ID = os.environ.get('NOTION_PAGE_ID')
+INVITATIONS_URL = 'https://api.github.com/user/repository_invitations'
+INVITATIONS_PER_PAGE = 100
 
+# Local state kept between runs (restored by the workflow cache)
+STATE_DB = os.environ.get('STATE_DB', '.state/state.sqlite3')
+DECLINE_MAX_WORKERS = int(os.environ.get('DECLINE_MAX_WORKERS', 4))
+DECLINE_REQUESTS_PER_SECOND = float(os.environ.get('DECLINE_REQUESTS_PER_SECOND', 5))
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 20))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 20))
+OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', 1))
+OUTBOX_FLUSH_SECONDS = float(os.environ.get('OUTBOX_FLUSH_SECONDS', 30))
+SHARD_INDEX = int(os.environ.get('SHARD_INDEX', 0))
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 1))
+LEASE_SECONDS = float(os.environ.get('LEASE_SECONDS', 600))
+TIME_BUDGET_SECONDS = float(os.environ.get('TIME_BUDGET_SECONDS', 600))
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+PROFILE_SAMPLE_SECONDS = float(os.environ.get('PROFILE_SAMPLE_SECONDS', 0.005))
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', 15))
+ACCOUNTS_CONFIG = os.environ.get('ACCOUNTS_CONFIG')
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 16))
 
-def get_notion_database_id(position_query):
-    url = f'https://api.notion.com/v1/blocks/{NOTION_PAGE_ID}/children'
-    response = requests.get(url, headers=NOTION_HEADERS).json()
+# One connection pool for GitHub, Notion and Slack, shared by all accounts
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+
+STATE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS expired_invitations (
+        invitation_id INTEGER PRIMARY KEY,
+        repo_name TEXT NOT NULL,
+        candidate_name TEXT,
+        profile_url TEXT,
+        created_at TEXT,
+        archived_at TEXT NOT NULL,
+        declined_at TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS slack_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message TEXT NOT NULL,
+        enqueued_at TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        delivered_at TEXT,
+        claimed_by TEXT,
+        claimed_until REAL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS slack_outbox_pending
+    ON slack_outbox (delivered_at, next_attempt_at)
+    ''',
+    # One message can cover several coalesced invitations of a candidate
+    '''
+    CREATE TABLE IF NOT EXISTS slack_outbox_invitations (
+        message_id INTEGER NOT NULL,
+        invitation_id INTEGER NOT NULL,
+        PRIMARY KEY (message_id, invitation_id)
+    )
+    ''',
+    # Latencies are stored in seconds next to the raw timestamps so that
+    # the report never has to parse dates
+    '''
+    CREATE TABLE IF NOT EXISTS processed_invitations (
+        invitation_id INTEGER PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        day TEXT NOT NULL,
+        role TEXT,
+        reviewer TEXT,
+        accepted_at TEXT,
+        notified_at TEXT,
+        time_to_accept REAL,
+        time_to_notify REAL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS processed_invitations_day
+    ON processed_invitations (day)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS processed_invitations_role_day
+    ON processed_invitations (role, day)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS candidate_reviewers (
+        candidate_key TEXT PRIMARY KEY,
+        reviewer TEXT NOT NULL,
+        assigned_at TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS work_queue (
+        invitation_id INTEGER PRIMARY KEY,
+        priority INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        enqueued_at TEXT NOT NULL,
+        account TEXT,
+        shard_key TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS invitation_leases (
+        invitation_id INTEGER PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''',
+]
+
+
+def single_flight(func):
+    '''
+    Cache the results of `func` like `functools.lru_cache`, except that callers
+    asking for the same arguments while the first call is still running wait
+    for it instead of repeating the request. Failures and empty results (Notion
+    sometimes fails to return users) are not cached, so later callers ask again.
+
+    return the wrapped function, with a `cache_clear` method
+    '''
+    futures = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        with lock:
+            future = futures.get(key)
+            is_first = future is None
+            if is_first:
+                future = futures[key] = Future()
+        if is_first:
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                with lock:
+                    futures.pop(key, None)
+                future.set_exception(e)
+            else:
+                if not result:
+                    with lock:
+                        futures.pop(key, None)
+                future.set_result(result)
+        return future.result()
+
+    def cache_clear():
+        with lock:
+            futures.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+
+# The Notion and Slack lookups below are cached for the duration of a run and
+# shared between accounts; main() clears them at the start of every run
+
+@single_flight
+def get_notion_database_id(position_query, page_id: str = None):
+    url = f'https://api.notion.com/v1/blocks/{page_id or NOTION_PAGE_ID}/children'
+    response = SESSION.get(url, headers=NOTION_HEADERS).json()
     matching_ids = [
         result['id']
         for result in response['results']
@@ -33,9 +206,10 @@ def get_notion_database_id(position_query):
     return matching_ids[0].replace('-', '') if len(matching_ids) == 1 else ''
 
 
+@single_flight
 def retrieve_all_take_home_reviewers(database_id: str) -> List[str]:
     endpoint = f'https://api.notion.com/v1/databases/{database_id}/query'
-    response = requests.post(endpoint, headers=NOTION_HEADERS, timeout=30).json()
+    response = SESSION.post(endpoint, headers=NOTION_HEADERS, timeout=30).json()
     results = response.get('results', [])
     emails = []
     for result in results:
@@ -58,21 +232,27 @@ def retrieve_all_take_home_reviewers(database_id: str) -> List[str]:
     return sorted(list(set(emails)))
 
 
-def get_next_name(invitation_id: int, names: List[str]) -> str:
+def stable_bucket(value, buckets: int) -> int:
     """
-    Retrieve distinct names for every new invitation ID
+    Map a value to one of `buckets` buckets, stable across runs and machines
     """
-    hash_object = hashlib.md5(str(invitation_id).encode())
+    hash_object = hashlib.md5(str(value).encode())
     hash_hex = hash_object.hexdigest()
 
     # Convert the first 8 characters of the hash to an integer
     hash_int = int(hash_hex[:8], 16)
-    index = hash_int % len(names)
+    return hash_int % buckets
 
-    return names[index]
+
+def get_next_name(invitation_id: int, names: List[str]) -> str:
+    """
+    Retrieve distinct names for every new invitation ID
+    """
+    return names[stable_bucket(invitation_id, len(names))]
 
 
 def get_notion_user_emails(database_id, created_at):
+    today = str(datetime.datetime.now())
     url = f'https://api.notion.com/v1/databases/{database_id}/query'
     body = {
         'filter': {
@@ -95,7 +275,7 @@ def get_notion_user_emails(database_id, created_at):
             ]
         }
     }
-    response = requests.post(url, headers=NOTION_HEADERS, data=json.dumps(body)).json()
+    response = SESSION.post(url, headers=NOTION_HEADERS, data=json.dumps(body)).json()
     results = response.get('results', [])
     properties = results[0].get('properties', {}) if results else {}
     record = properties.get(
@@ -107,18 +287,19 @@ def get_notion_user_emails(database_id, created_at):
     return [user['person']['email'] for user in record['people']]
 
 
+@single_flight
 def get_slack_user_id(user_email):
     url = f'https://slack.com/api/users.lookupByEmail?email={user_email}'
     headers = {
         'Authorization': f'Bearer {SLACK_TOKEN}',
         'Content-Type': 'application/json',
     }
-    response = requests.get(url, headers=headers).json()
+    response = SESSION.get(url, headers=headers).json()
     return response.get('user').get('id')
 
 
 def send_slack_message(message: str, timeout: int = 10) -> requests.Response:
-    response = requests.post(
+    response = SESSION.post(
         SLACK_WEBHOOK,
         data=json.dumps({'text': message}),
         headers={'Content-Type': 'application/json'},
@@ -159,24 +340,32 @@ AVAILABLE_ROLE_MAPPING = {
 
 HR_NAME = '@Susan Wong'
 
-def extract_candidate_info_from_repo(repo_name: str):
+# Work queue priorities, lowest first
+PRIORITY_FRESH = 0
+PRIORITY_UNPARSEABLE = 1
+PRIORITY_EXPIRED = 2
+
+# Updated regex to handle hyphens in names (e.g., Bar-Jhon)
+CANDIDATE_REPO_REGEX = r'^(?P<candidate_name>[A-Za-z\-]+_+[A-Za-z\-]+)_\w+_Technical_Assessment$'
+
+
+def extract_candidate_info_from_repo(repo_name: str, role_mapping: dict = None):
     '''
     Extract candidate name and position from the repo name using regex.
+    `role_mapping` defaults to AVAILABLE_ROLE_MAPPING.
 
     return a tuple of (candidate_name, position)
     '''
-    # Updated regex to handle hyphens in names (e.g., Bar-Jhon)
-    regex = r'^(?P<candidate_name>[A-Za-z\-]+_+[A-Za-z\-]+)_\w+_Technical_Assessment$'
-
     role = 'POSITION_NOT_FOUND'
 
     # find if any available role mapping matches the position
-    for keyword, _ in AVAILABLE_ROLE_MAPPING.items():
+    role_mapping = role_mapping or AVAILABLE_ROLE_MAPPING
+    for keyword, _ in role_mapping.items():
         if keyword in repo_name.lower():
-            role = AVAILABLE_ROLE_MAPPING[keyword]
+            role = role_mapping[keyword]
             break
 
-    match = re.match(regex, repo_name)
+    match = re.match(CANDIDATE_REPO_REGEX, repo_name)
     if not match:
         # Try to extract at least the first part before _Technical_Assessment
         fallback_match = re.match(r'^([A-Za-z\-_]+)', repo_name)
@@ -195,95 +384,1139 @@ def extract_candidate_info_from_repo(repo_name: str):
     )
 
 
-if __name__ == '__main__':
-    auth = HTTPBasicAuth('bowtie-careers', ACCESS_TOKEN)
+def build_profile_url(candidate_name: str) -> str:
+    """
+    Build the TeamTailor search URL for a candidate, if a name was found
+    """
+    if not candidate_name:
+        return None
 
-    invitations = requests.get(
-        'https://api.github.com/user/repository_invitations',
-        auth=auth,
-    ).json()
+    team_tailor_name_query = f'{{"query":"{candidate_name}","root":[]}}'
+    name_base64 = base64.b64encode(team_tailor_name_query.encode()).decode('utf-8')
+    return f'{SEARCH_URL}{name_base64}'
 
-    for invitation in invitations:
-        invitation_id = invitation['id']
 
-        today = str(datetime.datetime.now())
-        created_at = invitation['created_at']
-        repo_name = invitation['repository']['full_name'].split('/')[1]
-        url = invitation['url']
-        repo_url = invitation['repository']['html_url']
+def connect_state_db(path: str = None, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Open the local state database, creating the tables on first use
+    """
+    path = path or STATE_DB
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=check_same_thread)
+    for statement in STATE_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    return conn
+
+
+class GitHubAccount:
+    """
+    A hiring account whose repository invitations we process.
+
+    Each account has its own Notion page and role mapping, and keeps its own
+    GitHub rate-limit accounting, while the HTTP connection pool is shared.
+    """
 
+    def __init__(
+        self,
+        login: str,
+        token: str,
+        notion_page_id: str = None,
+        role_mapping: dict = None,
+    ):
+        self.login = login
+        self.auth = HTTPBasicAuth(login, token)
+        self.notion_page_id = notion_page_id or NOTION_PAGE_ID
+        self.role_mapping = role_mapping or AVAILABLE_ROLE_MAPPING
+        self.lock = threading.Lock()
+        self.requests_made = 0
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = None
 
-        candidate_name, position = extract_candidate_info_from_repo(repo_name)
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = getattr(SESSION, method)(url, auth=self.auth, **kwargs)
+        with self.lock:
+            self.requests_made += 1
+            remaining = response.headers.get('X-RateLimit-Remaining')
+            reset = response.headers.get('X-RateLimit-Reset')
+            if isinstance(remaining, str):
+                self.rate_limit_remaining = int(remaining)
+            if isinstance(reset, str):
+                self.rate_limit_reset = int(reset)
 
-        # Generate TeamTailor URL only if candidate name is found
-        profile_url = None
-        if candidate_name:
-            team_tailor_name_query = f'{{"query":"{candidate_name}","root":[]}}'
-            name_base64 = base64.b64encode(team_tailor_name_query.encode()).decode(
-                'utf-8'
+        return response
+
+    def print_rate_limit(self):
+        if self.rate_limit_remaining is None:
+            return
+        reset_at = datetime.datetime.fromtimestamp(
+            self.rate_limit_reset or 0, datetime.timezone.utc
+        )
+        print(
+            f'{self.login}: {self.requests_made} GitHub request(s), '
+            f'{self.rate_limit_remaining} left until {reset_at:%H:%M} UTC'
+        )
+
+
+def load_accounts(path: str = None) -> List[GitHubAccount]:
+    '''
+    Read the accounts to watch from a JSON config file:
+
+        {"accounts": [{"login": "...", "token_env": "ACCESS_TOKEN",
+                       "notion_page_id": "...", "roles": {"backend": "Backend Engineer"}}]}
+
+    `token` can be given instead of `token_env`; `notion_page_id` and `roles`
+    default to NOTION_PAGE_ID and AVAILABLE_ROLE_MAPPING. Without a config file
+    only the bowtie-careers account is watched; a config file without accounts
+    is rejected.
+    '''
+    if not path:
+        return [GitHubAccount('bowtie-careers', ACCESS_TOKEN)]
+
+    with open(path) as f:
+        config = json.load(f)
+    if not config.get('accounts'):
+        raise ValueError(f'No accounts configured in {path}')
+
+    return [
+        GitHubAccount(
+            entry['login'],
+            entry.get('token') or os.environ.get(entry.get('token_env', 'ACCESS_TOKEN')),
+            notion_page_id=entry.get('notion_page_id'),
+            role_mapping=entry.get('roles'),
+        )
+        for entry in config['accounts']
+    ]
+
+
+class Invitation(NamedTuple):
+    """
+    The fields of a GitHub repository invitation we actually use
+    """
+
+    id: int
+    created_at: str
+    expired: bool
+    url: str
+    repo_full_name: str
+    html_url: str
+
+    @property
+    def repo_name(self) -> str:
+        return self.repo_full_name.split('/')[1]
+
+    @classmethod
+    def from_json(cls, invitation: dict) -> 'Invitation':
+        repository = invitation['repository']
+        return cls(
+            invitation['id'],
+            invitation['created_at'],
+            invitation['expired'],
+            invitation['url'],
+            repository['full_name'],
+            repository.get('html_url'),
+        )
+
+
+def iter_invitations(account: GitHubAccount, per_page: int = None) -> Iterator[Invitation]:
+    """
+    Yield the account's pending invitations page by page, as slim records
+    """
+    per_page = per_page or INVITATIONS_PER_PAGE
+    for page in itertools.count(1):
+        invitations = account.request(
+            'get', INVITATIONS_URL, params={'per_page': per_page, 'page': page}
+        ).json()
+        yield from map(Invitation.from_json, invitations)
+        if len(invitations) < per_page:
+            return
+
+
+class RateLimiter:
+    """
+    Space out calls so that at most `rate` of them start per second, across threads
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0, slot - now))
+
+
+class SlackOutbox:
+    """
+    Durable Slack outbox backed by the state database.
+
+    Messages are written with `put` before the invitation is accepted and a
+    background worker delivers them in batches, retrying failures with
+    exponential backoff. Anything still undelivered when the run ends stays
+    in the database and is picked up by the next run, until a message has
+    failed `max_attempts` times and is reported as a dead letter instead.
+
+    Rows are claimed for `LEASE_SECONDS` before they are sent, so shards or
+    overlapping runs sharing the state file never deliver a message twice.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        batch_size: int = None,
+        max_attempts: int = None,
+    ):
+        self.conn = connect_state_db(path, check_same_thread=False)
+        self.batch_size = batch_size or OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or OUTBOX_MAX_ATTEMPTS
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{id(self)}'
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.worker = None
+
+    def put(self, message: str, invitation_ids: List[int] = ()):
+        enqueued_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO slack_outbox (message, enqueued_at) VALUES (?, ?)',
+                (message, enqueued_at),
+            )
+            self.conn.executemany(
+                'INSERT INTO slack_outbox_invitations (message_id, invitation_id) VALUES (?, ?)',
+                [(cursor.lastrowid, invitation_id) for invitation_id in invitation_ids],
             )
-            profile_url = f'{SEARCH_URL}{name_base64}'
+        self.wake.set()
 
-        if position == 'POSITION_NOT_FOUND' or not candidate_name:
-            message = f'Cannot extract candidate name or position from repo `{repo_name}`.'
-            if profile_url:
-                message += f' {profile_url}'
-            message += f' \n{HR_NAME}'
-            send_slack_message(message)
-            accept_invitation_response = requests.patch(url, auth=auth, timeout=10)
-            continue
-     
+    def drain(self) -> int:
+        '''
+        Try to deliver one batch of due messages.
+
+        return the number of messages attempted
+        '''
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE slack_outbox SET claimed_by = ?, claimed_until = ? WHERE id IN ('
+                'SELECT id FROM slack_outbox '
+                'WHERE delivered_at IS NULL AND next_attempt_at <= ? AND attempts < ? '
+                'AND (claimed_until IS NULL OR claimed_until < ?) '
+                'ORDER BY id LIMIT ?)',
+                (self.owner, now + LEASE_SECONDS, now, self.max_attempts, now, self.batch_size),
+            )
+            batch = self.conn.execute(
+                'SELECT id, message, attempts FROM slack_outbox '
+                'WHERE claimed_by = ? AND delivered_at IS NULL ORDER BY id',
+                (self.owner,),
+            ).fetchall()
+
+        delivered, failed = [], []
+        for message_id, message, attempts in batch:
+            try:
+                response = send_slack_message(message)
+                error = None if response.status_code == 200 else f'HTTP {response.status_code}'
+            except Exception as e:
+                # Whatever went wrong, keep the message and the worker alive
+                error = str(e)
+
+            if error is None:
+                delivered_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+                delivered.append((delivered_at, message_id))
+            else:
+                print(f'Slack delivery failed for outbox message {message_id}: {error}')
+                if attempts + 1 >= self.max_attempts:
+                    print(
+                        f'Giving up on outbox message {message_id} after '
+                        f'{attempts + 1} attempts: {message!r}'
+                    )
+                backoff = min(2 ** attempts, 300)
+                failed.append((time.time() + backoff, error, message_id))
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'UPDATE slack_outbox SET delivered_at = ?, attempts = attempts + 1, '
+                'claimed_by = NULL, claimed_until = NULL WHERE id = ?',
+                delivered,
+            )
+            self.conn.executemany(
+                'UPDATE processed_invitations SET notified_at = ?1, '
+                'time_to_notify = (julianday(?1) - julianday(created_at)) * 86400 '
+                'WHERE notified_at IS NULL AND invitation_id IN '
+                '(SELECT invitation_id FROM slack_outbox_invitations WHERE message_id = ?2)',
+                delivered,
+            )
+            self.conn.executemany(
+                'UPDATE slack_outbox SET next_attempt_at = ?, last_error = ?, '
+                'attempts = attempts + 1, claimed_by = NULL, claimed_until = NULL '
+                'WHERE id = ?',
+                failed,
+            )
+
+        return len(batch)
+
+    def seconds_until_next_due(self):
+        with self.lock:
+            # Rows claimed by another worker are due again once their claim lapses
+            (next_attempt_at,) = self.conn.execute(
+                'SELECT MIN(MAX(next_attempt_at, COALESCE(claimed_until, 0))) '
+                'FROM slack_outbox WHERE delivered_at IS NULL AND attempts < ?',
+                (self.max_attempts,),
+            ).fetchone()
+        if next_attempt_at is None:
+            return None
+        return max(0, next_attempt_at - time.time())
+
+    def _run(self):
+        while not self.stopping.is_set():
+            if not self.drain():
+                self.wake.wait(OUTBOX_POLL_SECONDS)
+                self.wake.clear()
+
+    def start(self):
+        self.worker = threading.Thread(target=self._run, name='slack-outbox', daemon=True)
+        self.worker.start()
+
+    def flush(self, timeout: float = None):
+        """
+        Keep delivering until nothing is due within `timeout` seconds
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else OUTBOX_FLUSH_SECONDS)
+        while time.monotonic() < deadline:
+            if self.drain():
+                continue
+            wait = self.seconds_until_next_due()
+            if wait is None or time.monotonic() + wait > deadline:
+                break
+            time.sleep(wait)
+
+        with self.lock:
+            pending, dead = self.conn.execute(
+                'SELECT COUNT(attempts < ?1 OR NULL), COUNT(attempts >= ?1 OR NULL) '
+                'FROM slack_outbox WHERE delivered_at IS NULL',
+                (self.max_attempts,),
+            ).fetchone()
+        if pending:
+            print(f'{pending} Slack message(s) left in the outbox for the next run')
+        if dead:
+            # Dead letters are never retried; they stay in the table for inspection
+            print(
+                f'{dead} Slack message(s) undeliverable after {self.max_attempts} attempts, '
+                'see slack_outbox.last_error'
+            )
+
+    def close(self, timeout: float = None):
+        if self.worker:
+            self.stopping.set()
+            self.wake.set()
+            self.worker.join()
+            self.worker = None
+        self.flush(timeout)
+        self.conn.close()
+
+
+def record_submission(
+    conn: sqlite3.Connection, invitation_id: int, created_at: str, role: str, reviewer: str
+):
+    """
+    Record an invitation we are about to notify about and accept
+    """
+    conn.execute(
+        'INSERT INTO processed_invitations (invitation_id, created_at, day, role, reviewer) '
+        'VALUES (?, ?, date(?), ?, ?) '
+        'ON CONFLICT (invitation_id) DO UPDATE SET role = excluded.role, '
+        'reviewer = excluded.reviewer',
+        (invitation_id, created_at, created_at, role, reviewer),
+    )
+    conn.commit()
+
+
+def record_acceptance(conn: sqlite3.Connection, invitation_id: int, accepted_at: str = None):
+    accepted_at = accepted_at or datetime.datetime.now(datetime.timezone.utc).isoformat()
+    conn.execute(
+        'UPDATE processed_invitations SET accepted_at = ?, '
+        'time_to_accept = (julianday(?) - julianday(created_at)) * 86400 '
+        'WHERE invitation_id = ?',
+        (accepted_at, accepted_at, invitation_id),
+    )
+    conn.commit()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize_latencies(conn: sqlite3.Connection, group_by: str, since: str = None) -> dict:
+    '''
+    Compute time-to-accept and time-to-notify percentiles grouped by `role` or `day`.
+
+    return {group: {'accepted': n, 'notified': m,
+                    'accept': (p50, p95, p99), 'notify': (p50, p95, p99)}}
+    '''
+    assert group_by in ('role', 'day')
+    summary = {}
+    for metric, count in (('accept', 'accepted'), ('notify', 'notified')):
+        column = f'time_to_{metric}'
+        rows = conn.execute(
+            f'SELECT {group_by}, {column} FROM processed_invitations '
+            f'WHERE {column} IS NOT NULL AND day >= ? '
+            f'ORDER BY {group_by}, {column}',
+            (since or '',),
+        )
+        for group, group_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            values = [value for _, value in group_rows]
+            stats = summary.setdefault(
+                group, {'accepted': 0, 'notified': 0, 'accept': None, 'notify': None}
+            )
+            stats[count] = len(values)
+            stats[metric] = tuple(percentile(values, p) for p in (0.5, 0.95, 0.99))
+
+    return summary
+
+
+def reviewer_workload(conn: sqlite3.Connection, since: str = None) -> List[tuple]:
+    '''
+    return a list of (reviewer, role, count), busiest reviewers first
+    '''
+    return conn.execute(
+        'SELECT reviewer, role, COUNT(*) AS assigned FROM processed_invitations '
+        'WHERE reviewer IS NOT NULL AND day >= ? '
+        'GROUP BY reviewer, role ORDER BY assigned DESC, reviewer',
+        (since or '',),
+    ).fetchall()
+
+
+def format_duration(seconds: float) -> str:
+    if seconds is None:
+        return '-'
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f'{minutes}m'
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f'{hours}h{minutes:02d}m'
+    return f'{hours // 24}d{hours % 24:02d}h'
 
-        if invitation['expired']:
-            message = f'Invitation for candidate `{candidate_name}` has expired.'
-            if profile_url:
-                message += f' {profile_url}'
-            message += f' \n{HR_NAME}'
-            send_slack_message(message)
-            continue
 
+def print_latency_report(conn: sqlite3.Connection, since: str = None):
+    header = (
+        f'{"":<28}{"accepted":>9}  {"accept p50/p95/p99":>24}'
+        f'{"notified":>10}  {"notify p50/p95/p99":>24}'
+    )
+    for group_by in ('role', 'day'):
+        print(f'Time to accept / notify by {group_by}' + (f' since {since}' if since else ''))
+        print(header)
+        for group, stats in summarize_latencies(conn, group_by, since).items():
+            accept, notify = (
+                '/'.join(format_duration(value) for value in (stats[metric] or (None,) * 3))
+                for metric in ('accept', 'notify')
+            )
+            print(
+                f'{str(group):<28}{stats["accepted"]:>9}  {accept:>24}'
+                f'{stats["notified"]:>10}  {notify:>24}'
+            )
+        print()
+
+    print('Reviewer workload')
+    for reviewer, role, assigned in reviewer_workload(conn, since):
+        print(f'{reviewer:<40}{role:<28}{assigned:>6}')
+
+
+def claim_invitation(
+    conn: sqlite3.Connection, invitation_id: int, owner: str, ttl: float = None
+) -> bool:
+    '''
+    Take the lease on an invitation unless another worker holds an unexpired one.
+
+    return whether `owner` now holds the lease
+    '''
+    now = time.time()
+    cursor = conn.execute(
+        'INSERT INTO invitation_leases (invitation_id, owner, expires_at) VALUES (?, ?, ?) '
+        'ON CONFLICT (invitation_id) DO UPDATE SET '
+        'owner = excluded.owner, expires_at = excluded.expires_at '
+        'WHERE invitation_leases.expires_at < ? OR invitation_leases.owner = excluded.owner',
+        (invitation_id, owner, now + (ttl if ttl is not None else LEASE_SECONDS), now),
+    )
+    conn.commit()
+    return cursor.rowcount == 1
+
+
+def release_invitation(conn: sqlite3.Connection, invitation_id: int, owner: str):
+    conn.execute(
+        'DELETE FROM invitation_leases WHERE invitation_id = ? AND owner = ?',
+        (invitation_id, owner),
+    )
+    conn.commit()
+
+
+class RunProfiler:
+    """
+    Opt-in profiling of a run.
+
+    Each `section` (outbox start-up, fetching, building the queue, expired
+    handling, every candidate, the final outbox flush) runs under its own
+    cProfile and is dumped to `<name>.pstats`; the sections are merged into
+    `run.pstats`, which covers the whole run apart from thread start-up.
+    Sections of concurrently processed accounts run side by side, except on
+    Python 3.12+ where only one cProfile can be active at a time and they take
+    turns (using up the time budget while they wait). A section opened inside
+    another one in the same thread is folded into the outer one. A sampling
+    thread records the stacks of all threads, so network waits in the outbox
+    and decline workers show up too, and writes them to `run.collapsed` for
+    flame graph tools.
+    """
 
-        notion_database_id = (
-            get_notion_database_id(position)
-            if position != 'POSITION_NOT_FOUND'
-            else ''
+    def __init__(self, output_dir: str, sample_seconds: float = None, top_n: int = None):
+        self.output_dir = output_dir
+        self.sample_seconds = sample_seconds or PROFILE_SAMPLE_SECONDS
+        self.top_n = top_n or PROFILE_TOP_N
+        self.section_files = []
+        self.stacks = collections.Counter()
+        self.stopping = threading.Event()
+        self.sampler = None
+        self.active = threading.local()
+        # cProfile is per thread up to 3.11; from 3.12 it is process-wide
+        self.lock = threading.Lock() if sys.version_info >= (3, 12) else nullcontext()
+
+    @contextmanager
+    def section(self, name: str):
+        if getattr(self.active, 'section', None):
+            yield
+            return
+
+        with self.lock:
+            self.active.section = name
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                self.active.section = None
+                path = os.path.join(self.output_dir, f'{name}.pstats')
+                profile.dump_stats(path)
+                self.section_files.append(path)
+
+    def _sample(self):
+        sampler_id = threading.get_ident()
+        while not self.stopping.wait(self.sample_seconds):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+                    )
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.sampler.join()
+
+        collapsed_path = os.path.join(self.output_dir, 'run.collapsed')
+        with open(collapsed_path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
+
+        if not self.section_files:
+            return
+        stats = pstats.Stats(*self.section_files, stream=sys.stdout)
+        stats.dump_stats(os.path.join(self.output_dir, 'run.pstats'))
+        print(f'Profile written to {self.output_dir} (run.pstats, run.collapsed)')
+        stats.strip_dirs().sort_stats('tottime').print_stats(self.top_n)
+
+
+def profiled(profiler: RunProfiler, name: str):
+    return profiler.section(name) if profiler else nullcontext()
+
+
+def archive_expired_invitations(
+    conn: sqlite3.Connection, invitations: List[Invitation]
+) -> List[tuple]:
+    '''
+    Record expired invitations in the local archive, once per invitation ID.
+
+    return a list of (candidate_name, profile_url) for the newly archived ones
+    '''
+    archived_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    newly_archived = []
+    for invitation in invitations:
+        repo_name = invitation.repo_name
+        candidate_name, _ = extract_candidate_info_from_repo(repo_name)
+        profile_url = build_profile_url(candidate_name)
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO expired_invitations '
+            '(invitation_id, repo_name, candidate_name, profile_url, created_at, archived_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                invitation.id,
+                repo_name,
+                candidate_name,
+                profile_url,
+                invitation.created_at,
+                archived_at,
+            ),
         )
-        if not notion_database_id:
-            message = (
-                f'Reviewer not found for position: {position} '
-                f'while processing candidate `{candidate_name}`.'
+        if cursor.rowcount:
+            newly_archived.append((candidate_name or repo_name, profile_url))
+    conn.commit()
+
+    return newly_archived
+
+
+def decline_invitations(
+    invitation_ids: List[int],
+    account: GitHubAccount,
+    max_workers: int = None,
+    rate: float = None,
+) -> List[int]:
+    '''
+    Decline invitations concurrently through the invitations DELETE endpoint.
+
+    return the IDs that are no longer pending on GitHub
+    '''
+    limiter = RateLimiter(rate if rate is not None else DECLINE_REQUESTS_PER_SECOND)
+
+    def decline(invitation_id):
+        limiter.wait()
+        try:
+            response = account.request(
+                'delete', f'{INVITATIONS_URL}/{invitation_id}', timeout=10
             )
+        except requests.RequestException as e:
+            print(f'Failed to decline invitation {invitation_id}: {e}')
+            return invitation_id, None
+        return invitation_id, response.status_code
+
+    declined = []
+    with ThreadPoolExecutor(max_workers=max_workers or DECLINE_MAX_WORKERS) as executor:
+        for invitation_id, status_code in executor.map(decline, invitation_ids):
+            print(f'Declined expired invitation {invitation_id} - Status: {status_code}')
+            # 404 means the invitation is already gone, which is what we want
+            if status_code in (204, 404):
+                declined.append(invitation_id)
+
+    return declined
+
+
+def handle_expired_invitations(
+    conn: sqlite3.Connection,
+    outbox: SlackOutbox,
+    invitations: List[Invitation],
+    account: GitHubAccount,
+):
+    """
+    Archive expired invitations, announce new ones once and decline them in bulk
+    """
+    newly_archived = archive_expired_invitations(conn, invitations)
+    if newly_archived:
+        lines = [f'{len(newly_archived)} invitation(s) have expired and are being declined:']
+        for candidate_name, profile_url in newly_archived:
+            line = f'• `{candidate_name}`'
             if profile_url:
-                message += f' {profile_url}'
-            message += f' \n{HR_NAME}'
-            send_slack_message(message)
-            accept_invitation_response = requests.patch(url, auth=auth, timeout=10)
-            continue
+                line += f' {profile_url}'
+            lines.append(line)
+        lines.append(HR_NAME)
+        outbox.put('\n'.join(lines))
+
+    declined_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    declined = decline_invitations([invitation.id for invitation in invitations], account)
+    conn.executemany(
+        'UPDATE expired_invitations SET declined_at = ? WHERE invitation_id = ?',
+        [(declined_at, invitation_id) for invitation_id in declined],
+    )
+    conn.commit()
+
+
+def normalize_candidate_name(candidate_name: str) -> str:
+    """
+    Lower-case the name and drop hyphens and other separators
+    """
+    return ' '.join(re.findall(r'[a-z]+', candidate_name.casefold()))
+
+
+def identify_candidate(invitation: Invitation, role_mapping: dict = None) -> tuple:
+    '''
+    return (candidate_name, position, key) where `key` is shared by all
+    invitations of a candidate for a role from the same repo owner. Names
+    guessed from repos not following the `<First>_<Last>_<Role>_Technical_Assessment`
+    template could belong to anyone, so those invitations are keyed by their ID.
+    '''
+    repo_name = invitation.repo_name
+    candidate_name, position = extract_candidate_info_from_repo(repo_name, role_mapping)
+    if position != 'POSITION_NOT_FOUND' and re.match(CANDIDATE_REPO_REGEX, repo_name):
+        owner = invitation.repo_full_name.split('/')[0].lower()
+        key = f'{owner}|{normalize_candidate_name(candidate_name)}|{position}'
+    else:
+        key = str(invitation.id)
+    return candidate_name, position, key
+
+
+def coalesce_invitations(
+    invitations: List[Invitation], role_mapping: dict = None
+) -> List[tuple]:
+    '''
+    Group invitations from the same candidate for the same role, e.g. a re-created
+    repo or one whose name was typed differently. A candidate applying for two
+    roles gets a group (and a reviewer) per role.
+
+    return a list of (candidate_name, position, invitations) in order of first
+    appearance; invitations without a candidate name or position stay on their own
+    '''
+    groups = {}
+    for invitation in invitations:
+        candidate_name, position, key = identify_candidate(invitation, role_mapping)
+        groups.setdefault(key, (candidate_name, position, []))[2].append(invitation)
+
+    return list(groups.values())
+
+
+def assign_reviewer(
+    conn: sqlite3.Connection, candidate_key: str, reviewers: List[str], invitation_id: int
+) -> str:
+    """
+    Keep the reviewer a candidate had before, as long as they are still on the roster
+    """
+    row = conn.execute(
+        'SELECT reviewer FROM candidate_reviewers WHERE candidate_key = ?', (candidate_key,)
+    ).fetchone()
+    if row and row[0] in reviewers:
+        return row[0]
+
+    reviewer = get_next_name(invitation_id, reviewers)
+    conn.execute(
+        'INSERT INTO candidate_reviewers (candidate_key, reviewer, assigned_at) VALUES (?, ?, ?) '
+        'ON CONFLICT (candidate_key) DO UPDATE SET '
+        'reviewer = excluded.reviewer, assigned_at = excluded.assigned_at',
+        (candidate_key, reviewer, datetime.datetime.now(datetime.timezone.utc).isoformat()),
+    )
+    conn.commit()
+    return reviewer
 
 
-        notion_user_emails = retrieve_all_take_home_reviewers(notion_database_id)
-        if notion_user_emails:
-            email = get_next_name(invitation_id, notion_user_emails)
-            slack_user_id = get_slack_user_id(email)
-            mentions = f'<@{slack_user_id}> :adore-x5: '
+def notify_and_accept(
+    conn: sqlite3.Connection,
+    outbox: SlackOutbox,
+    invitations: List[Invitation],
+    account: GitHubAccount,
+    message: str,
+    role: str = None,
+    reviewer: str = None,
+):
+    """
+    Queue one Slack message for the invitations, then accept each of them
+    """
+    for invitation in invitations:
+        record_submission(conn, invitation.id, invitation.created_at, role, reviewer)
+    outbox.put(message, [invitation.id for invitation in invitations])
+    for invitation in invitations:
+        response = account.request('patch', invitation.url, timeout=10)
+        if response.status_code == 204:
+            record_acceptance(conn, invitation.id)
+
+
+def process_candidate(
+    candidate_name: str,
+    position: str,
+    invitations: List[Invitation],
+    account: GitHubAccount,
+    conn: sqlite3.Connection,
+    outbox: SlackOutbox,
+):
+    first_invitation = invitations[0]
+    created_at = max(invitation.created_at for invitation in invitations)
+    repo_name = first_invitation.repo_name
+
+    # Generate TeamTailor URL only if candidate name is found
+    profile_url = build_profile_url(candidate_name)
+
+    if position == 'POSITION_NOT_FOUND' or not candidate_name:
+        message = f'Cannot extract candidate name or position from repo `{repo_name}`.'
+        if profile_url:
+            message += f' {profile_url}'
+        message += f' \n{HR_NAME}'
+        notify_and_accept(conn, outbox, invitations, account, message, role=position)
+        return
+
+    notion_database_id = get_notion_database_id(position, account.notion_page_id)
+    if not notion_database_id:
+        message = (
+            f'Reviewer not found for position: {position} '
+            f'while processing candidate `{candidate_name}`.'
+        )
+        if profile_url:
+            message += f' {profile_url}'
+        message += f' \n{HR_NAME}'
+        notify_and_accept(conn, outbox, invitations, account, message, role=position)
+        return
+
+    notion_user_emails = retrieve_all_take_home_reviewers(notion_database_id)
+    if notion_user_emails:
+        # Accounts have their own candidates, so a reviewer is kept per account
+        _, _, key = identify_candidate(first_invitation, account.role_mapping)
+        candidate_key = f'{account.login}|{key}'
+        reviewer = assign_reviewer(conn, candidate_key, notion_user_emails, first_invitation.id)
+        slack_user_id = get_slack_user_id(reviewer)
+        mentions = f'<@{slack_user_id}> :adore-x5: '
+    else:
+        print(f'No reviewers found in Notion database for position: {position}')
+        reviewer = None
+        if 'backend' in position.lower():
+            reviewer = random.choice(back_backend_fallback_reviewer)
+            mentions = ' '.join(reviewer) + ' :adore-x5: '
+        elif 'frontend' in position.lower():
+            reviewer = random.choice(frontend_fallback_reviewer)
+            mentions = ' '.join(reviewer) + ' :adore-x5: '
         else:
-            print(f'No reviewers found in Notion database for position: {position}')
-            if 'backend' in position.lower():
-                mentions = ' '.join(random.choice(back_backend_fallback_reviewer)) + ' :adore-x5: '
-            elif 'frontend' in position.lower():
-                mentions = ' '.join(random.choice(frontend_fallback_reviewer)) + ' :adore-x5: '
-            else:
-                mentions = '`Engineers 404 NOT FOUND` :shock:'
-      
-        message_parts = [
-            'New assessment from candidate has been submitted at ',
-            f'`{created_at}` :tada:',
-            repo_url,
+            mentions = '`Engineers 404 NOT FOUND` :shock:'
+
+    message_parts = [
+        'New assessment from candidate has been submitted at ',
+        f'`{created_at}` :tada:',
+    ]
+    message_parts.extend(invitation.html_url for invitation in invitations)
+    if profile_url:
+        message_parts.append(profile_url)
+    message_parts.append(mentions)
+    message = '\n'.join(message_parts)
+    notify_and_accept(
+        conn, outbox, invitations, account, message, role=position, reviewer=reviewer
+    )
+
+
+def invitation_priority(invitation: Invitation, role_mapping: dict = None) -> int:
+    """
+    Fresh submissions we can route first, then ones needing HR, expired last
+    """
+    if invitation.expired:
+        return PRIORITY_EXPIRED
+
+    repo_name = invitation.repo_name
+    candidate_name, position = extract_candidate_info_from_repo(repo_name, role_mapping)
+    if not candidate_name or position == 'POSITION_NOT_FOUND':
+        return PRIORITY_UNPARSEABLE
+    return PRIORITY_FRESH
+
+
+def sync_work_queue(
+    conn: sqlite3.Connection,
+    invitations: List[Invitation],
+    shard_index: int = 0,
+    shard_count: int = 1,
+    account: GitHubAccount = None,
+) -> dict:
+    '''
+    Enqueue newly seen invitations and drop the ones GitHub no longer lists for
+    the account from this shard. Invitations carried over from an earlier run
+    keep their stored priority and enqueue time, so they go before newer ones,
+    unless processing them failed before; those go after work that never did.
+
+    return {invitation_id: (priority, attempts, enqueued_at)} for the given invitations
+    '''
+    login = account.login if account else None
+    role_mapping = account.role_mapping if account else None
+    enqueued_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    conn.executemany(
+        'INSERT OR IGNORE INTO work_queue '
+        '(invitation_id, priority, created_at, enqueued_at, account, shard_key) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            (
+                invitation.id,
+                invitation_priority(invitation, role_mapping),
+                invitation.created_at,
+                enqueued_at,
+                login,
+                identify_candidate(invitation, role_mapping)[2],
+            )
+            for invitation in invitations
+        ],
+    )
+
+    pending_ids = {invitation.id for invitation in invitations}
+    stored = conn.execute(
+        'SELECT invitation_id, priority, attempts, enqueued_at, shard_key FROM work_queue '
+        'WHERE account IS ? OR account IS NULL',
+        (login,),
+    ).fetchall()
+    conn.executemany(
+        'DELETE FROM work_queue WHERE invitation_id = ?',
+        [
+            (invitation_id,)
+            for invitation_id, _, _, _, shard_key in stored
+            if invitation_id not in pending_ids
+            and stable_bucket(shard_key or invitation_id, shard_count) == shard_index
+        ],
+    )
+    conn.commit()
+
+    return {
+        invitation_id: (priority, attempts, enqueued_at)
+        for invitation_id, priority, attempts, enqueued_at, _ in stored
+        if invitation_id in pending_ids
+    }
+
+
+def record_failed_attempt(conn: sqlite3.Connection, invitation_ids: List[int]):
+    conn.executemany(
+        'UPDATE work_queue SET attempts = attempts + 1 WHERE invitation_id = ?',
+        [(invitation_id,) for invitation_id in invitation_ids],
+    )
+    conn.commit()
+
+
+def dequeue_invitations(conn: sqlite3.Connection, invitation_ids: List[int]):
+    conn.executemany(
+        'DELETE FROM work_queue WHERE invitation_id = ?',
+        [(invitation_id,) for invitation_id in invitation_ids],
+    )
+    conn.commit()
+
+
+def process_account(
+    account: GitHubAccount,
+    outbox: SlackOutbox,
+    shard_index: int,
+    shard_count: int,
+    deadline: float,
+    profiler: RunProfiler = None,
+):
+    # Leases keep overlapping runs (push + schedule) from handling the same
+    # invitation twice, sharded or not
+    lease_owner = f'{socket.gethostname()}:{os.getpid()}:{shard_index}/{shard_count}'
+
+    with profiled(profiler, f'{account.login}-fetch'):
+        # Pages are streamed in; only this shard's slim records are kept for the queue.
+        # Shards split by candidate so that their invitations are coalesced together.
+        invitations = [
+            invitation
+            for invitation in iter_invitations(account)
+            if stable_bucket(identify_candidate(invitation, account.role_mapping)[2], shard_count)
+            == shard_index
         ]
-        if profile_url:
-            message_parts.append(profile_url)
-        message_parts.append(mentions)
-        message = '\n'.join(message_parts)
-        send_slack_message(message)
-        accept_invitation_response = requests.patch(url, auth=auth, timeout=10)
-         
+
+    with ExitStack() as stack:
+        with profiled(profiler, f'{account.login}-queue'):
+            conn = stack.enter_context(closing(connect_state_db()))
+            queued = sync_work_queue(conn, invitations, shard_index, shard_count, account)
+
+            # Fresh submissions first, then work carried over from earlier runs
+            # before newly seen work, oldest first, so that the ones that matter
+            # are accepted even when the run runs out of time. Work that failed
+            # before goes after work that never did. Resubmissions and
+            # multi-repo submissions of a candidate are handled (and notified) once.
+            queue = []
+            pending_invitations = [
+                invitation for invitation in invitations if not invitation.expired
+            ]
+            for candidate_name, position, group in coalesce_invitations(
+                pending_invitations, account.role_mapping
+            ):
+                heapq.heappush(
+                    queue,
+                    (
+                        min(queued[invitation.id] for invitation in group),
+                        min(invitation.created_at for invitation in group),
+                        len(queue),
+                        (candidate_name, position, group),
+                    ),
+                )
+
+            # Expired invitations can never be accepted, so they are archived and
+            # declined in bulk instead of lingering in the list on every run
+            expired_invitations = sorted(
+                (invitation for invitation in invitations if invitation.expired),
+                key=lambda invitation: (queued[invitation.id], invitation.created_at),
+            )
+            if expired_invitations:
+                heapq.heappush(
+                    queue, ((PRIORITY_EXPIRED, ''), '', len(queue), expired_invitations)
+                )
+
+        while queue:
+            if time.monotonic() >= deadline:
+                print(
+                    f'Time budget used up, {len(queue)} item(s) carried over '
+                    f'to the next run ({account.login})'
+                )
+                break
+
+            *_, item = heapq.heappop(queue)
+            if item is expired_invitations:
+                # Declines are rate limited, so only start the ones that fit in the budget
+                limit = len(expired_invitations)
+                if DECLINE_REQUESTS_PER_SECOND > 0:
+                    limit = int((deadline - time.monotonic()) * DECLINE_REQUESTS_PER_SECOND)
+                batch, rest = expired_invitations[:limit], expired_invitations[limit:]
+                if batch:
+                    with profiled(profiler, f'{account.login}-expired'):
+                        handle_expired_invitations(conn, outbox, batch, account)
+                    dequeue_invitations(conn, [invitation.id for invitation in batch])
+                if rest:
+                    print(
+                        f'Time budget used up, {len(rest)} expired invitation(s) carried '
+                        f'over to the next run ({account.login})'
+                    )
+                continue
+
+            candidate_name, position, group = item
+            claimed = []
+            for invitation in group:
+                if claim_invitation(conn, invitation.id, lease_owner):
+                    claimed.append(invitation)
+                else:
+                    print(f'Invitation {invitation.id} is being handled by another worker')
+            if not claimed:
+                continue
+            claimed_ids = [invitation.id for invitation in claimed]
+            try:
+                with profiled(profiler, f'{account.login}-candidate-{claimed_ids[0]}'):
+                    process_candidate(candidate_name, position, claimed, account, conn, outbox)
+            except Exception as e:
+                # One broken candidate must not hold up the rest of the queue: it is
+                # retried by the next run (or another worker), after fresh work
+                print(
+                    f'Failed to process invitation(s) {claimed_ids} ({account.login}), '
+                    f'retrying next run: {type(e).__name__}: {e}'
+                )
+                for invitation_id in claimed_ids:
+                    release_invitation(conn, invitation_id, lease_owner)
+                record_failed_attempt(conn, claimed_ids)
+                continue
+            dequeue_invitations(conn, claimed_ids)
+
+
+def main(
+    shard_index: int = None,
+    shard_count: int = None,
+    profiler: RunProfiler = None,
+    time_budget: float = None,
+    accounts: List[GitHubAccount] = None,
+):
+    deadline = time.monotonic() + (time_budget if time_budget is not None else TIME_BUDGET_SECONDS)
+    shard_index = SHARD_INDEX if shard_index is None else shard_index
+    shard_count = shard_count or SHARD_COUNT
+    # Checked after the environment defaults, so a bad SHARD_INDEX fails loudly
+    # instead of quietly filtering out every invitation
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(
+            f'Shard index {shard_index} is out of range for {shard_count} shard(s)'
+        )
+    if accounts is None:
+        accounts = load_accounts(ACCOUNTS_CONFIG)
+
+    # Rosters and Slack identities are looked up once per run, for all accounts
+    get_notion_database_id.cache_clear()
+    retrieve_all_take_home_reviewers.cache_clear()
+    get_slack_user_id.cache_clear()
+
+    with profiled(profiler, 'outbox-start'):
+        outbox = SlackOutbox()
+        # Messages left over from previous runs go out alongside this run's
+        outbox.start()
+    try:
+        with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+            futures = [
+                executor.submit(
+                    process_account,
+                    account,
+                    outbox,
+                    shard_index,
+                    shard_count,
+                    deadline,
+                    profiler,
+                )
+                for account in accounts
+            ]
+        for account in accounts:
+            account.print_rate_limit()
+        # Re-raise the first failure only after every account had its turn
+        for future in futures:
+            future.result()
+    finally:
+        # Whatever is not delivered within the budget is sent by the next run
+        with profiled(profiler, 'outbox-flush'):
+            outbox.close(min(OUTBOX_FLUSH_SECONDS, max(0, deadline - time.monotonic())))
+
+
+def cli(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Accept candidate assessment invitations')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='process pending invitations (default)')
+    run_parser.add_argument(
+        '--shard-index', type=int, default=None, help='this worker\'s shard (0-based)'
+    )
+    run_parser.add_argument(
+        '--shard-count', type=int, default=None, help='number of workers sharing the invitations'
+    )
+    run_parser.add_argument(
+        '--accounts',
+        metavar='FILE',
+        default=ACCOUNTS_CONFIG,
+        help='JSON file listing the accounts to process (default: bowtie-careers only)',
+    )
+    run_parser.add_argument(
+        '--time-budget',
+        type=float,
+        default=None,
+        metavar='SECONDS',
+        help='stop starting new work after SECONDS; the rest is carried over',
+    )
+    run_parser.add_argument(
+        '--profile',
+        metavar='DIR',
+        default=PROFILE_DIR,
+        help='write pstats and collapsed-stack profiles of the run to DIR',
+    )
+    report_parser = subparsers.add_parser(
+        'report', help='time-to-accept / time-to-notify percentiles and reviewer workload'
+    )
+    report_parser.add_argument('--since', help='only include submissions from YYYY-MM-DD on')
+    report_parser.add_argument('--db', default=None, help='state database path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'report':
+        with closing(connect_state_db(args.db)) as conn:
+            print_latency_report(conn, args.since)
+    else:
+        profile_dir = getattr(args, 'profile', PROFILE_DIR)
+        profiler = RunProfiler(profile_dir) if profile_dir else None
+        if profiler:
+            profiler.start()
+        try:
+            main(
+                shard_index=getattr(args, 'shard_index', None),
+                shard_count=getattr(args, 'shard_count', None),
+                profiler=profiler,
+                time_budget=getattr(args, 'time_budget', None),
+                accounts=load_accounts(getattr(args, 'accounts', ACCOUNTS_CONFIG)),
+            )
+        finally:
+            if profiler:
+                profiler.stop()
+
+
+if __name__ == '__main__':
+    cli()
@@ -7,7 +7,57 @@ import sys
 
 import run
 
+SLACK_WEBHOOK = 'https://mock-slack.com/webhook'
 
+
+def notion_databases_response(*titles):
+    """Notion page children with one database per title"""
+    return mock.Mock(
+        json=lambda: {
+            'results': [
+                {
+                    'id': title.lower().replace(' ', '-') + '-db',
+                    'child_database': {'title': title},
+                }
+                for title in titles
+            ]
+        }
+    )
+
+
+def notion_or_slack_post(reviewers_by_database):
+    """Answer Notion reviewer queries from `reviewers_by_database`, accept Slack posts"""
+
+    def post(url, **kwargs):
+        if url == SLACK_WEBHOOK:
+            return mock.Mock(status_code=200)
+        database_id = url.split('/databases/')[1].split('/')[0]
+        email = reviewers_by_database[database_id]
+        return mock.Mock(
+            json=lambda: {
+                'results': [
+                    {
+                        'properties': {
+                            'Take-home Assignment': {'people': [{'person': {'email': email}}]}
+                        }
+                    }
+                ]
+            }
+        )
+
+    return post
+
+
+def slack_messages(mock_post):
+    return [
+        json.loads(call[1]['data'])['text']
+        for call in mock_post.call_args_list
+        if call[0][0] == SLACK_WEBHOOK
+    ]
+
+
+@mock.patch('run.STATE_DB', ':memory:')
+@mock.patch('run.SLACK_WEBHOOK', SLACK_WEBHOOK)
 class TestMainBlock(unittest.TestCase):
     @mock.patch.dict(
         'os.environ',
@@ -21,14 +71,13 @@ class TestMainBlock(unittest.TestCase):
         },
     )
     @mock.patch('sys.stdout', new_callable=StringIO)
-    @mock.patch('requests.get')
-    @mock.patch('requests.post')
-    @mock.patch('requests.patch')
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.patch')
     def test_successful_invitation_acceptance(
         self, mock_patch, mock_post, mock_get, mock_stdout
     ):
         """Test successful processing of a valid repository invitation."""
-        # Mock GitHub invitations request
         mock_get.side_effect = [
             # GitHub invitations response
             mock.Mock(
@@ -46,65 +95,36 @@ class TestMainBlock(unittest.TestCase):
                 ]
             ),
             # Notion database children response
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'id': 'mock-database-id',
-                            'child_database': {'title': 'Backend Engineer'},
-                        }
-                    ]
-                }
-            ),
-            # Notion database query response
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'properties': {
-                                'Take-home Assignment': {
-                                    'people': [
-                                        {'person': {'email': 'reviewer@example.com'}}
-                                    ]
-                                }
-                            }
-                        }
-                    ]
-                }
-            ),
+            notion_databases_response('Backend Engineer'),
             # Slack user lookup response
             mock.Mock(json=lambda: {'user': {'id': 'U12345'}}),
         ]
-
-        # Mock response status codes
-        mock_post.return_value = mock.Mock(status_code=200)
+        mock_post.side_effect = notion_or_slack_post({'backendengineerdb': 'reviewer@example.com'})
         mock_patch.return_value = mock.Mock(status_code=204)
 
         # Run the main function
         run.main()
 
-        # Assert that the invitation was processed correctly
         output = mock_stdout.getvalue()
-        self.assertIn('Accepting invitation ID 12345', output)
-        self.assertIn('Responses: Slack - 200, GitHub - 204', output)
-
-        # Verify the correct API calls were made
-        self.assertEqual(mock_get.call_count, 4)
-        self.assertEqual(mock_post.call_count, 1)  # Slack webhook
-        self.assertEqual(mock_patch.call_count, 1)  # GitHub accept invitation
-
-        # Verify GitHub invitation API was called
-        self.assertTrue(
-            any(
-                call[0][0] == 'https://api.github.com/user/repository_invitations'
-                for call in mock_get.call_args_list
-            )
+        self.assertIn('Slack notification sent - Status: 200', output)
+
+        # Invitations, Notion databases and Slack user lookup
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(
+            mock_get.call_args_list[0][0][0],
+            'https://api.github.com/user/repository_invitations',
+        )
+        # Notion reviewers query and the Slack webhook
+        self.assertEqual(mock_post.call_count, 2)
+        mock_patch.assert_called_once_with(
+            'https://api.github.com/invitations/12345', auth=mock.ANY, timeout=10
         )
 
         # Verify Slack webhook was called with the correct message
-        slack_payload = json.loads(mock_post.call_args[1]['data'])
-        self.assertIn(':adore-x5:', slack_payload['text'])
-        self.assertIn('U12345', slack_payload['text'])
+        slack_text = slack_messages(mock_post)[0]
+        self.assertIn(':adore-x5:', slack_text)
+        self.assertIn('<@U12345>', slack_text)
+        self.assertIn('https://github.com/org/John_Doe_Backend_Technical_Assessment', slack_text)
 
     @mock.patch.dict(
         'os.environ',
@@ -118,14 +138,13 @@ class TestMainBlock(unittest.TestCase):
         },
     )
     @mock.patch('sys.stdout', new_callable=StringIO)
-    @mock.patch('requests.get')
-    @mock.patch('requests.post')
-    @mock.patch('requests.patch')
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.patch')
     def test_no_matching_notion_database(
         self, mock_patch, mock_post, mock_get, mock_stdout
     ):
         """Test invitation processing when no matching Notion database is found."""
-        # Mock GitHub invitations request
         mock_get.side_effect = [
             # GitHub invitations response
             mock.Mock(
@@ -136,40 +155,27 @@ class TestMainBlock(unittest.TestCase):
                         'created_at': '2023-07-15T12:00:00Z',
                         'url': 'https://api.github.com/invitations/12345',
                         'repository': {
-                            'full_name': 'org/John_Doe_Unknown_Role_Technical_Assessment',
-                            'html_url': 'https://github.com/org/John_Doe_Unknown_Role_Technical_Assessment',
+                            'full_name': 'org/John_Doe_DevOps_Technical_Assessment',
+                            'html_url': 'https://github.com/org/John_Doe_DevOps_Technical_Assessment',
                         },
                     }
                 ]
             ),
             # Notion database children response (no match)
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'id': 'frontend-database-id',
-                            'child_database': {'title': 'Frontend Engineer'},
-                        }
-                    ]
-                }
-            ),
+            notion_databases_response('Frontend Engineer'),
         ]
-
-        # Mock response status codes
-        mock_post.return_value = mock.Mock(status_code=200)
+        mock_post.side_effect = notion_or_slack_post({})
         mock_patch.return_value = mock.Mock(status_code=204)
 
         # Run the main function
         run.main()
 
-        # Assert that the invitation was processed with a warning
-        output = mock_stdout.getvalue()
-        self.assertIn('No matching notion database found', output)
-        self.assertIn('Accepting invitation ID 12345', output)
-
-        # Verify the Slack message includes the 404 engineers message
-        slack_payload = json.loads(mock_post.call_args[1]['data'])
-        self.assertIn('`Engineers 404 NOT FOUND`', slack_payload['text'])
+        # HR is pinged and the invitation is still accepted
+        slack_text = slack_messages(mock_post)[0]
+        self.assertIn('Reviewer not found for position: DevOps Engineer', slack_text)
+        self.assertIn('`John Doe`', slack_text)
+        self.assertIn(run.HR_NAME, slack_text)
+        mock_patch.assert_called_once()
 
     @mock.patch.dict(
         'os.environ',
@@ -183,15 +189,18 @@ class TestMainBlock(unittest.TestCase):
         },
     )
     @mock.patch('sys.stdout', new_callable=StringIO)
-    @mock.patch('requests.get')
-    def test_expired_invitation(self, mock_get, mock_stdout):
-        """Test handling of expired invitations."""
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.delete')
+    def test_expired_invitation(self, mock_delete, mock_post, mock_get, mock_stdout):
+        """Test expired invitations are archived, announced once and declined."""
         # Mock GitHub API response with an expired invitation
         mock_get.return_value = mock.Mock(
             json=lambda: [
                 {
                     'id': 12345,
                     'expired': True,
+                    'created_at': '2023-07-01T12:00:00Z',
                     'url': 'https://api.github.com/invitations/12345',
                     'repository': {
                         'full_name': 'org/John_Doe_Backend_Technical_Assessment',
@@ -199,14 +208,25 @@ class TestMainBlock(unittest.TestCase):
                 }
             ]
         )
+        mock_post.return_value = mock.Mock(status_code=200)
+        mock_delete.return_value = mock.Mock(status_code=204)
 
         # Run the main function
         run.main()
 
-        # Assert that expired invitation was skipped
+        # Assert that expired invitation was declined instead of accepted
         output = mock_stdout.getvalue()
-        self.assertIn('Skipped handling invitation 12345', output)
-        self.assertIn('because the invitation has expired', output)
+        self.assertIn('Declined expired invitation 12345 - Status: 204', output)
+        mock_delete.assert_called_once_with(
+            'https://api.github.com/user/repository_invitations/12345',
+            auth=mock.ANY,
+            timeout=10,
+        )
+
+        # A single summary message is sent for the expired candidates
+        self.assertEqual(mock_post.call_count, 1)
+        slack_payload = json.loads(mock_post.call_args[1]['data'])
+        self.assertIn('`John Doe`', slack_payload['text'])
 
     @mock.patch.dict(
         'os.environ',
@@ -220,10 +240,11 @@ class TestMainBlock(unittest.TestCase):
         },
     )
     @mock.patch('sys.stdout', new_callable=StringIO)
-    @mock.patch('requests.get')
-    def test_exception_handling(self, mock_get, mock_stdout):
-        """Test exception handling during invitation processing."""
-        # Mock GitHub API response
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.patch')
+    def test_exception_handling(self, mock_patch, mock_post, mock_get, mock_stdout):
+        """Test an error while processing one candidate does not stop the others."""
         mock_get.side_effect = [
             # GitHub invitations response
             mock.Mock(
@@ -237,21 +258,44 @@ class TestMainBlock(unittest.TestCase):
                             'full_name': 'org/John_Doe_Backend_Technical_Assessment',
                             'html_url': 'https://github.com/org/John_Doe_Backend_Technical_Assessment',
                         },
-                    }
+                    },
+                    {
+                        'id': 12346,
+                        'expired': False,
+                        'created_at': '2023-07-15T13:00:00Z',
+                        'url': 'https://api.github.com/invitations/12346',
+                        'repository': {
+                            'full_name': 'org/Jane_Smith_Frontend_Technical_Assessment',
+                            'html_url': 'https://github.com/org/Jane_Smith_Frontend_Technical_Assessment',
+                        },
+                    },
                 ]
             ),
-            # Make Notion API call raise an exception
-            Exception("Test error"),
+            # Make the Notion API call for the first candidate raise an exception
+            Exception('Test error'),
+            # Notion database children and Slack user lookup for the second one
+            notion_databases_response('Frontend Engineer'),
+            mock.Mock(json=lambda: {'user': {'id': 'U12346'}}),
         ]
+        mock_post.side_effect = notion_or_slack_post(
+            {'frontendengineerdb': 'frontend-reviewer@example.com'}
+        )
+        mock_patch.return_value = mock.Mock(status_code=204)
 
         # Run the main function
         run.main()
 
-        # Assert that exception was caught and logged
+        # The error is logged and the failed invitation is left for the next run
         output = mock_stdout.getvalue()
         self.assertIn(
-            'Error occurred when accepting invitation for invitation 12345', output
+            'Failed to process invitation(s) [12345] (bowtie-careers), '
+            'retrying next run: Exception: Test error',
+            output,
         )
+        mock_patch.assert_called_once_with(
+            'https://api.github.com/invitations/12346', auth=mock.ANY, timeout=10
+        )
+        self.assertIn('<@U12346>', slack_messages(mock_post)[0])
 
     @mock.patch.dict(
         'os.environ',
@@ -265,7 +309,7 @@ class TestMainBlock(unittest.TestCase):
         },
     )
     @mock.patch('sys.stdout', new_callable=StringIO)
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_no_invitations(self, mock_get, mock_stdout):
         """Test behavior when there are no repository invitations."""
         # Mock GitHub API response with empty list
@@ -290,130 +334,84 @@ class TestMainBlock(unittest.TestCase):
         },
     )
     @mock.patch('sys.stdout', new_callable=StringIO)
-    @mock.patch('requests.get')
-    @mock.patch('requests.post')
-    @mock.patch('requests.patch')
-    def test_multiple_invitations(self, mock_patch, mock_post, mock_get, mock_stdout):
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.patch')
+    @mock.patch('requests.Session.delete')
+    def test_multiple_invitations(
+        self, mock_delete, mock_patch, mock_post, mock_get, mock_stdout
+    ):
         """Test processing multiple invitations with different roles."""
-        # Mock GitHub API response with multiple invitations
-        mock_get.side_effect = [
-            # GitHub invitations response with multiple invites
-            mock.Mock(
-                json=lambda: [
-                    {
-                        'id': 12345,
-                        'expired': False,
-                        'created_at': '2023-07-15T12:00:00Z',
-                        'url': 'https://api.github.com/invitations/12345',
-                        'repository': {
-                            'full_name': 'org/John_Doe_Backend_Technical_Assessment',
-                            'html_url': 'https://github.com/org/John_Doe_Backend_Technical_Assessment',
-                        },
-                    },
-                    {
-                        'id': 12346,
-                        'expired': False,
-                        'created_at': '2023-07-15T13:00:00Z',
-                        'url': 'https://api.github.com/invitations/12346',
-                        'repository': {
-                            'full_name': 'org/Jane_Smith_Frontend_Technical_Assessment',
-                            'html_url': 'https://github.com/org/Jane_Smith_Frontend_Technical_Assessment',
-                        },
-                    },
-                    {
-                        'id': 12347,
-                        'expired': True,
-                        'url': 'https://api.github.com/invitations/12347',
-                        'repository': {
-                            'full_name': 'org/Bob_Brown_Data_Technical_Assessment',
-                        },
-                    },
-                ]
-            ),
-            # Notion database response for Backend
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'id': 'backend-database-id',
-                            'child_database': {'title': 'Backend Engineer'},
-                        }
-                    ]
-                }
-            ),
-            # Notion database query response for Backend
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'properties': {
-                                'Take-home Assignment': {
-                                    'people': [
-                                        {
-                                            'person': {
-                                                'email': 'backend-reviewer@example.com'
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        }
-                    ]
-                }
-            ),
-            # Slack user lookup response for Backend
-            mock.Mock(json=lambda: {'user': {'id': 'U12345'}}),
-            # Notion database response for Frontend
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'id': 'frontend-database-id',
-                            'child_database': {'title': 'Frontend Engineer'},
-                        }
-                    ]
-                }
-            ),
-            # Notion database query response for Frontend
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'properties': {
-                                'Take-home Assignment': {
-                                    'people': [
-                                        {
-                                            'person': {
-                                                'email': 'frontend-reviewer@example.com'
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        }
-                    ]
-                }
-            ),
-            # Slack user lookup response for Frontend
-            mock.Mock(json=lambda: {'user': {'id': 'U12346'}}),
+        invitations = [
+            {
+                'id': 12345,
+                'expired': False,
+                'created_at': '2023-07-15T12:00:00Z',
+                'url': 'https://api.github.com/invitations/12345',
+                'repository': {
+                    'full_name': 'org/John_Doe_Backend_Technical_Assessment',
+                    'html_url': 'https://github.com/org/John_Doe_Backend_Technical_Assessment',
+                },
+            },
+            {
+                'id': 12346,
+                'expired': False,
+                'created_at': '2023-07-15T13:00:00Z',
+                'url': 'https://api.github.com/invitations/12346',
+                'repository': {
+                    'full_name': 'org/Jane_Smith_Frontend_Technical_Assessment',
+                    'html_url': 'https://github.com/org/Jane_Smith_Frontend_Technical_Assessment',
+                },
+            },
+            {
+                'id': 12347,
+                'expired': True,
+                'created_at': '2023-07-01T13:00:00Z',
+                'url': 'https://api.github.com/invitations/12347',
+                'repository': {
+                    'full_name': 'org/Bob_Brown_Data_Technical_Assessment',
+                },
+            },
         ]
 
-        # Mock responses
-        mock_post.return_value = mock.Mock(status_code=200)
+        def get(url, **kwargs):
+            if url == 'https://api.github.com/user/repository_invitations':
+                return mock.Mock(json=lambda: invitations)
+            if 'notion' in url:
+                return notion_databases_response('Backend Engineer', 'Frontend Engineer')
+            user_id = 'U12345' if 'backend-reviewer' in url else 'U12346'
+            return mock.Mock(json=lambda: {'user': {'id': user_id}})
+
+        mock_get.side_effect = get
+        mock_post.side_effect = notion_or_slack_post(
+            {
+                'backendengineerdb': 'backend-reviewer@example.com',
+                'frontendengineerdb': 'frontend-reviewer@example.com',
+            }
+        )
         mock_patch.return_value = mock.Mock(status_code=204)
+        mock_delete.return_value = mock.Mock(status_code=204)
 
         # Run the main function
         run.main()
 
-        # Assert all invitations were processed appropriately
+        # Fresh invitations are accepted, the expired one is declined
         output = mock_stdout.getvalue()
-        self.assertIn('Accepting invitation ID 12345', output)
-        self.assertIn('Accepting invitation ID 12346', output)
-        self.assertIn('Skipped handling invitation 12347', output)
+        self.assertIn('Declined expired invitation 12347 - Status: 204', output)
+        self.assertEqual(
+            [call[0][0] for call in mock_patch.call_args_list],
+            [
+                'https://api.github.com/invitations/12345',
+                'https://api.github.com/invitations/12346',
+            ],
+        )
 
-        # Verify the correct number of API calls were made
-        self.assertEqual(mock_patch.call_count, 2)
-        self.assertEqual(mock_post.call_count, 2)
+        # One ping per candidate plus the expired summary
+        messages = slack_messages(mock_post)
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(any('<@U12345>' in message for message in messages))
+        self.assertTrue(any('<@U12346>' in message for message in messages))
+        self.assertTrue(any('`Bob Brown`' in message for message in messages))
 
     @mock.patch.dict(
         'os.environ',
@@ -427,58 +425,200 @@ class TestMainBlock(unittest.TestCase):
         },
     )
     @mock.patch('sys.stdout', new_callable=StringIO)
-    @mock.patch('requests.get')
-    @mock.patch('requests.post')
-    @mock.patch('requests.patch')
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.patch')
     def test_invalid_repo_name_format(
         self, mock_patch, mock_post, mock_get, mock_stdout
     ):
         """Test handling of a repository with invalid name format."""
-        # Mock GitHub API response with invalid repo name format
-        mock_get.side_effect = [
-            # GitHub invitations response
-            mock.Mock(
-                json=lambda: [
-                    {
-                        'id': 12345,
-                        'expired': False,
-                        'created_at': '2023-07-15T12:00:00Z',
-                        'url': 'https://api.github.com/invitations/12345',
-                        'repository': {
-                            'full_name': 'org/InvalidRepoName',
-                            'html_url': 'https://github.com/org/InvalidRepoName',
-                        },
-                    }
-                ]
-            ),
-            # Notion database children response (no match because of invalid repo name)
-            mock.Mock(
-                json=lambda: {
-                    'results': [
-                        {
-                            'id': 'frontend-database-id',
-                            'child_database': {'title': 'Frontend Engineer'},
-                        }
-                    ]
+        mock_get.return_value = mock.Mock(
+            json=lambda: [
+                {
+                    'id': 12345,
+                    'expired': False,
+                    'created_at': '2023-07-15T12:00:00Z',
+                    'url': 'https://api.github.com/invitations/12345',
+                    'repository': {
+                        'full_name': 'org/InvalidRepoName',
+                        'html_url': 'https://github.com/org/InvalidRepoName',
+                    },
                 }
-            ),
-        ]
-
-        # Mock responses
-        mock_post.return_value = mock.Mock(status_code=200)
+            ]
+        )
+        mock_post.side_effect = notion_or_slack_post({})
         mock_patch.return_value = mock.Mock(status_code=204)
 
         # Run the main function
         run.main()
 
-        # Assert the invitation was processed with default values
+        # Only the invitations are fetched, Notion is never asked
+        self.assertEqual(mock_get.call_count, 1)
+        mock_patch.assert_called_once()
+
+        # HR is asked to have a look
+        slack_text = slack_messages(mock_post)[0]
+        self.assertIn(
+            'Cannot extract candidate name or position from repo `InvalidRepoName`',
+            slack_text,
+        )
+        self.assertIn(run.HR_NAME, slack_text)
+
+    @mock.patch('sys.stdout', new_callable=StringIO)
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.patch')
+    def test_time_budget_carries_work_over(self, mock_patch, mock_get, mock_stdout):
+        """Test that nothing new is started once the time budget is used up."""
+        mock_get.return_value = mock.Mock(
+            json=lambda: [
+                {
+                    'id': 12345,
+                    'expired': False,
+                    'created_at': '2023-07-15T12:00:00Z',
+                    'url': 'https://api.github.com/invitations/12345',
+                    'repository': {
+                        'full_name': 'org/John_Doe_Backend_Technical_Assessment',
+                        'html_url': 'https://github.com/org/John_Doe_Backend_Technical_Assessment',
+                    },
+                }
+            ]
+        )
+
+        run.main(time_budget=0)
+
         output = mock_stdout.getvalue()
-        self.assertIn('Accepting invitation ID 12345', output)
-        self.assertIn('No matching notion database found', output)
+        self.assertIn('1 item(s) carried over to the next run', output)
+        mock_patch.assert_not_called()
+
+    @mock.patch('run.SHARD_INDEX', 2)
+    @mock.patch('requests.Session.get')
+    def test_out_of_range_shard_is_rejected(self, mock_get):
+        """Test that a shard index outside the shard count stops the run."""
+        for argv in (['run', '--shard-index', '2'], ['run', '--shard-count', '2']):
+            with self.subTest(argv=argv):
+                with self.assertRaisesRegex(ValueError, 'Shard index 2 is out of range'):
+                    run.cli(argv)
+        mock_get.assert_not_called()
 
-        # Verify the Slack message contains placeholder text
-        slack_payload = json.loads(mock_post.call_args[1]['data'])
-        self.assertIn('`Engineers 404 NOT FOUND`', slack_payload['text'])
+    @mock.patch('sys.stdout', new_callable=StringIO)
+    @mock.patch('run.DECLINE_REQUESTS_PER_SECOND', 2)
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.delete')
+    def test_expired_declines_fit_the_time_budget(
+        self, mock_delete, mock_post, mock_get, mock_stdout
+    ):
+        """Test that only the declines that fit in the time left are started."""
+        mock_get.return_value = mock.Mock(
+            json=lambda: [
+                {
+                    'id': invitation_id,
+                    'expired': True,
+                    'created_at': f'2023-07-1{invitation_id}T12:00:00Z',
+                    'url': f'https://api.github.com/invitations/{invitation_id}',
+                    'repository': {
+                        'full_name': f'org/Candidate{invitation_id}_Backend_Technical_Assessment',
+                    },
+                }
+                for invitation_id in (3, 1, 2)
+            ]
+        )
+        mock_post.return_value = mock.Mock(status_code=200)
+        mock_delete.return_value = mock.Mock(status_code=204)
+
+        # Two declines a second and a one second budget leave room for one
+        run.main(time_budget=1)
+
+        output = mock_stdout.getvalue()
+        self.assertIn('2 expired invitation(s) carried over to the next run', output)
+        # The oldest invitation goes first
+        mock_delete.assert_called_once_with(
+            'https://api.github.com/user/repository_invitations/1', auth=mock.ANY, timeout=10
+        )
+
+    @mock.patch('sys.stdout', new_callable=StringIO)
+    @mock.patch('requests.Session.get')
+    @mock.patch('requests.Session.post')
+    @mock.patch('requests.Session.patch')
+    def test_multiple_accounts_share_caches(
+        self, mock_patch, mock_post, mock_get, mock_stdout
+    ):
+        """Test accounts are processed together and share roster and Slack lookups."""
+        rate_limit_headers = {'X-RateLimit-Remaining': '4999', 'X-RateLimit-Reset': '0'}
+
+        def invitations_for(account_name, invitation_id):
+            return [
+                {
+                    'id': invitation_id,
+                    'expired': False,
+                    'created_at': '2023-07-15T12:00:00Z',
+                    'url': f'https://api.github.com/invitations/{invitation_id}',
+                    'repository': {
+                        'full_name': f'{account_name}/John_Doe_Backend_Technical_Assessment',
+                        'html_url': f'https://github.com/{account_name}/repo',
+                    },
+                }
+            ]
+
+        def get(url, auth=None, **kwargs):
+            if url == 'https://api.github.com/user/repository_invitations':
+                invitation_id = {'first': 1, 'second': 2}[auth.username]
+                return mock.Mock(
+                    json=lambda: invitations_for(auth.username, invitation_id),
+                    headers=rate_limit_headers,
+                )
+            if 'notion' in url:
+                return mock.Mock(
+                    json=lambda: {
+                        'results': [
+                            {'id': 'backend-db', 'child_database': {'title': 'Backend Engineer'}}
+                        ]
+                    }
+                )
+            return mock.Mock(json=lambda: {'user': {'id': 'U12345'}})
+
+        def post(url, **kwargs):
+            if url and 'notion' in url:
+                return mock.Mock(
+                    json=lambda: {
+                        'results': [
+                            {
+                                'properties': {
+                                    'Take-home Assignment': {
+                                        'people': [{'person': {'email': 'reviewer@example.com'}}]
+                                    }
+                                }
+                            }
+                        ]
+                    }
+                )
+            return mock.Mock(status_code=200)
+
+        mock_get.side_effect = get
+        mock_post.side_effect = post
+        mock_patch.return_value = mock.Mock(status_code=204, headers=rate_limit_headers)
+
+        accounts = [run.GitHubAccount('first', 'token-1'), run.GitHubAccount('second', 'token-2')]
+        with mock.patch('run.assign_reviewer', wraps=run.assign_reviewer) as mock_assign:
+            run.main(accounts=accounts)
+
+        urls = [
+            call.args[0] or ''
+            for call in mock_get.call_args_list + mock_post.call_args_list
+        ]
+        self.assertEqual(sum('/blocks/' in url for url in urls), 1)
+        self.assertEqual(sum('databases/backenddb' in url for url in urls), 1)
+        self.assertEqual(sum('users.lookupByEmail' in url for url in urls), 1)
+        self.assertEqual(mock_patch.call_count, 2)
+        # Reviewer assignments are kept per account
+        self.assertEqual(
+            sorted(call.args[1] for call in mock_assign.call_args_list),
+            ['first|first|john doe|Backend Engineer', 'second|second|john doe|Backend Engineer'],
+        )
+        self.assertEqual([account.requests_made for account in accounts], [2, 2])
+        output = mock_stdout.getvalue()
+        self.assertIn('first: 2 GitHub request(s), 4999 left', output)
+        self.assertIn('second: 2 GitHub request(s), 4999 left', output)
 
 
 if __name__ == '__main__':
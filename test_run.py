@@ -1,6 +1,55 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from io import StringIO
+from unittest import mock
 
-from run import extract_candidate_info_from_repo
+import requests
+
+from run import (
+    archive_expired_invitations,
+    assign_reviewer,
+    claim_invitation,
+    coalesce_invitations,
+    connect_state_db,
+    decline_invitations,
+    extract_candidate_info_from_repo,
+    GitHubAccount,
+    identify_candidate,
+    Invitation,
+    invitation_priority,
+    iter_invitations,
+    load_accounts,
+    percentile,
+    record_acceptance,
+    record_failed_attempt,
+    record_submission,
+    release_invitation,
+    reviewer_workload,
+    RunProfiler,
+    single_flight,
+    SlackOutbox,
+    stable_bucket,
+    summarize_latencies,
+    sync_work_queue,
+)
+
+
+def make_invitation(invitation_id, repo_name, expired=False, created_at=None):
+    return Invitation(
+        invitation_id,
+        created_at or f'2024-01-0{invitation_id}T00:00:00Z',
+        expired,
+        f'https://api.github.com/user/repository_invitations/{invitation_id}',
+        f'org/{repo_name}',
+        f'https://github.com/org/{repo_name}',
+    )
 
 
 class TestRun(unittest.TestCase):
@@ -95,3 +144,597 @@ class TestRun(unittest.TestCase):
             with self.subTest(repo_name=repo_name):
                 result = extract_candidate_info_from_repo(repo_name)
                 self.assertEqual(result, expected)
+
+
+class TestExpiredInvitations(unittest.TestCase):
+    def test_archive_expired_invitations_records_each_invitation_once(self):
+        invitations = [
+            make_invitation(1, 'John_Doe_Backend_Technical_Assessment', expired=True),
+            make_invitation(2, 'InvalidRepoName', expired=True),
+        ]
+
+        with closing(connect_state_db(':memory:')) as conn:
+            first = archive_expired_invitations(conn, invitations)
+            second = archive_expired_invitations(conn, invitations)
+            rows = conn.execute(
+                'SELECT invitation_id, candidate_name FROM expired_invitations '
+                'ORDER BY invitation_id'
+            ).fetchall()
+
+        self.assertEqual([name for name, _ in first], ['John Doe', 'InvalidRepoName'])
+        self.assertEqual(second, [])
+        self.assertEqual(rows, [(1, 'John Doe'), (2, 'InvalidRepoName')])
+
+    @mock.patch('requests.Session.delete')
+    def test_decline_invitations(self, mock_delete):
+        status_codes = {1: 204, 2: 404, 3: 500}
+        mock_delete.side_effect = lambda url, **kwargs: mock.Mock(
+            status_code=status_codes[int(url.rsplit('/', 1)[1])]
+        )
+
+        with mock.patch('sys.stdout'):
+            declined = decline_invitations([1, 2, 3], GitHubAccount('someone', 'token'), rate=0)
+
+        self.assertEqual(declined, [1, 2])
+        self.assertEqual(mock_delete.call_count, 3)
+
+
+class TestSlackOutbox(unittest.TestCase):
+    def setUp(self):
+        self.outbox = SlackOutbox(':memory:', batch_size=2)
+        self.addCleanup(self.outbox.conn.close)
+
+    def pending(self):
+        return self.outbox.conn.execute(
+            'SELECT message, attempts FROM slack_outbox '
+            'WHERE delivered_at IS NULL ORDER BY id'
+        ).fetchall()
+
+    @mock.patch('run.send_slack_message')
+    def test_drain_delivers_in_batches(self, mock_send):
+        mock_send.return_value = mock.Mock(status_code=200)
+        for i in range(3):
+            self.outbox.put(f'message {i}', [i])
+
+        self.assertEqual(self.outbox.drain(), 2)
+        self.assertEqual(self.pending(), [('message 2', 0)])
+        self.assertEqual(self.outbox.drain(), 1)
+        self.assertEqual(self.outbox.drain(), 0)
+        self.assertEqual(
+            [call.args[0] for call in mock_send.call_args_list],
+            ['message 0', 'message 1', 'message 2'],
+        )
+
+    @mock.patch('run.send_slack_message')
+    def test_failed_messages_are_kept_for_retry(self, mock_send):
+        mock_send.side_effect = requests.ConnectionError('slack is down')
+        self.outbox.put('hello')
+
+        with mock.patch('sys.stdout'):
+            self.assertEqual(self.outbox.drain(), 1)
+            # Backing off, so not due again yet
+            self.assertEqual(self.outbox.drain(), 0)
+            self.outbox.flush(timeout=0)
+
+        self.assertEqual(self.pending(), [('hello', 1)])
+        self.assertGreater(self.outbox.seconds_until_next_due(), 0)
+
+        mock_send.side_effect = None
+        mock_send.return_value = mock.Mock(status_code=200)
+        self.outbox.conn.execute('UPDATE slack_outbox SET next_attempt_at = 0')
+        self.outbox.drain()
+        self.assertEqual(self.pending(), [])
+
+    @mock.patch('run.send_slack_message')
+    def test_messages_are_dead_lettered_after_max_attempts(self, mock_send):
+        mock_send.return_value = mock.Mock(status_code=500)
+        outbox = SlackOutbox(':memory:', max_attempts=2)
+        self.addCleanup(outbox.conn.close)
+        outbox.put('hello')
+        outbox.put('world')
+
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            outbox.drain()
+            outbox.conn.execute('UPDATE slack_outbox SET next_attempt_at = 0 WHERE id = 1')
+            outbox.drain()
+            # Dead letters are not retried
+            outbox.conn.execute('UPDATE slack_outbox SET next_attempt_at = 0 WHERE id = 1')
+            self.assertEqual(outbox.drain(), 0)
+            outbox.flush(timeout=0)
+
+        output = stdout.getvalue()
+        self.assertIn("Giving up on outbox message 1 after 2 attempts: 'hello'", output)
+        self.assertIn('1 Slack message(s) left in the outbox for the next run', output)
+        self.assertIn('1 Slack message(s) undeliverable after 2 attempts', output)
+
+    @mock.patch('run.send_slack_message')
+    def test_workers_sharing_state_do_not_double_send(self, mock_send):
+        with tempfile.TemporaryDirectory() as state_dir:
+            path = os.path.join(state_dir, 'state.sqlite3')
+            first = SlackOutbox(path, batch_size=2)
+            second = SlackOutbox(path, batch_size=2)
+            self.addCleanup(first.conn.close)
+            self.addCleanup(second.conn.close)
+            for i in range(3):
+                first.put(f'message {i}')
+
+            def send(message):
+                # The second worker drains while the first one is mid-batch
+                if message == 'message 0':
+                    self.assertEqual(second.drain(), 1)
+                return mock.Mock(status_code=200)
+
+            mock_send.side_effect = send
+            self.assertEqual(first.drain(), 2)
+            self.assertEqual(second.drain(), 0)
+
+        self.assertEqual(
+            sorted(call.args[0] for call in mock_send.call_args_list),
+            ['message 0', 'message 1', 'message 2'],
+        )
+
+    @mock.patch('run.send_slack_message')
+    def test_background_worker_delivers(self, mock_send):
+        mock_send.return_value = mock.Mock(status_code=200)
+        outbox = SlackOutbox(':memory:')
+        outbox.start()
+        outbox.put('hello')
+        outbox.close()
+
+        mock_send.assert_called_once_with('hello')
+
+
+class TestLatencyTracking(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summarize_latencies(self):
+        with closing(connect_state_db(':memory:')) as conn:
+            record_submission(conn, 1, '2024-01-01T00:00:00Z', 'Backend Engineer', 'a@x.com')
+            record_submission(conn, 2, '2024-01-01T10:00:00Z', 'Backend Engineer', 'b@x.com')
+            record_submission(conn, 3, '2024-01-02T00:00:00Z', 'Frontend Engineer', 'a@x.com')
+            record_acceptance(conn, 1, '2024-01-01T00:15:00+00:00')
+            record_acceptance(conn, 2, '2024-01-01T11:00:00+00:00')
+            record_acceptance(conn, 3, '2024-01-02T00:30:00+00:00')
+
+            by_role = summarize_latencies(conn, 'role')
+            by_day = summarize_latencies(conn, 'day', since='2024-01-02')
+            workload = reviewer_workload(conn)
+
+        self.assertEqual(by_role['Backend Engineer']['accepted'], 2)
+        self.assertEqual(by_role['Backend Engineer']['notified'], 0)
+        self.assertAlmostEqual(by_role['Backend Engineer']['accept'][0], 900, places=0)
+        self.assertAlmostEqual(by_role['Backend Engineer']['accept'][2], 3600, places=0)
+        self.assertIsNone(by_role['Backend Engineer']['notify'])
+        self.assertEqual(list(by_day), ['2024-01-02'])
+        self.assertEqual(workload[0], ('a@x.com', 'Backend Engineer', 1))
+        self.assertEqual(len(workload), 3)
+
+    @mock.patch('run.send_slack_message')
+    def test_outbox_delivery_records_notify_time(self, mock_send):
+        mock_send.return_value = mock.Mock(status_code=200)
+        outbox = SlackOutbox(':memory:')
+        self.addCleanup(outbox.conn.close)
+        record_submission(outbox.conn, 1, '2024-01-01T00:00:00Z', 'AI Engineer', None)
+        record_submission(outbox.conn, 2, '2024-01-02T00:00:00Z', 'AI Engineer', None)
+        record_submission(outbox.conn, 3, '2024-01-02T00:00:00Z', 'AI Engineer', None)
+        # A coalesced message covers both invitations of the candidate
+        outbox.put('hello', [1, 2])
+        outbox.drain()
+
+        rows = outbox.conn.execute(
+            'SELECT notified_at, time_to_notify FROM processed_invitations ORDER BY invitation_id'
+        ).fetchall()
+        for notified_at, time_to_notify in rows[:2]:
+            self.assertIsNotNone(notified_at)
+            self.assertGreater(time_to_notify, 0)
+        self.assertEqual(rows[2], (None, None))
+
+        # Nothing was accepted yet, so only the notify side has a count
+        stats = summarize_latencies(outbox.conn, 'role')['AI Engineer']
+        self.assertEqual((stats['accepted'], stats['notified']), (0, 2))
+        self.assertIsNone(stats['accept'])
+
+
+class TestShardingAndLeases(unittest.TestCase):
+    def test_stable_bucket_partitions_invitations(self):
+        invitation_ids = range(1000, 1100)
+        shards = [
+            {i for i in invitation_ids if stable_bucket(i, 3) == shard} for shard in range(3)
+        ]
+
+        self.assertEqual(set().union(*shards), set(invitation_ids))
+        self.assertEqual(sum(len(shard) for shard in shards), 100)
+        self.assertTrue(all(shards))
+
+    def test_candidate_invitations_share_a_shard(self):
+        invitations = [
+            make_invitation(1, 'John_Doe_Backend_Technical_Assessment'),
+            make_invitation(2, 'john_doe_Backend_Engineer_Technical_Assessment'),
+            make_invitation(3, 'John_Doe_Frontend_Technical_Assessment'),
+        ]
+        keys = [identify_candidate(invitation)[2] for invitation in invitations]
+
+        self.assertEqual(
+            keys, ['org|john doe|Backend Engineer'] * 2 + ['org|john doe|Frontend Engineer']
+        )
+        self.assertEqual(identify_candidate(make_invitation(4, 'InvalidRepoName'))[2], '4')
+        for shard_count in range(2, 6):
+            self.assertEqual(
+                stable_bucket(keys[0], shard_count), stable_bucket(keys[1], shard_count)
+            )
+
+    def test_claim_invitation(self):
+        with closing(connect_state_db(':memory:')) as conn:
+            self.assertTrue(claim_invitation(conn, 1, 'worker-a'))
+            self.assertFalse(claim_invitation(conn, 1, 'worker-b'))
+            # Re-claiming our own lease extends it
+            self.assertTrue(claim_invitation(conn, 1, 'worker-a'))
+            self.assertTrue(claim_invitation(conn, 2, 'worker-b'))
+
+            release_invitation(conn, 1, 'worker-b')
+            self.assertFalse(claim_invitation(conn, 1, 'worker-b'))
+            release_invitation(conn, 1, 'worker-a')
+            self.assertTrue(claim_invitation(conn, 1, 'worker-b', ttl=-1))
+            # An expired lease can be taken over
+            self.assertTrue(claim_invitation(conn, 1, 'worker-a'))
+
+
+class TestRunProfiler(unittest.TestCase):
+    def test_profiler_writes_pstats_and_collapsed_stacks(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = RunProfiler(output_dir, sample_seconds=0.001, top_n=5)
+            profiler.start()
+            for name in ('fetch', 'invitation-1'):
+                with profiler.section(name):
+                    deadline = time.monotonic() + 0.05
+                    while time.monotonic() < deadline:
+                        extract_candidate_info_from_repo('John_Doe_Backend_Technical_Assessment')
+            with mock.patch('sys.stdout'):
+                profiler.stop()
+
+            self.assertTrue(
+                {'fetch.pstats', 'invitation-1.pstats', 'run.pstats', 'run.collapsed'}
+                <= set(os.listdir(output_dir))
+            )
+            with open(os.path.join(output_dir, 'run.collapsed')) as f:
+                lines = f.read().splitlines()
+
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(count.isdigit())
+        self.assertTrue(any('extract_candidate_info_from_repo' in line for line in lines))
+
+    def test_concurrent_sections(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = RunProfiler(output_dir)
+            entered = threading.Event()
+
+            def other_account():
+                with profiler.section('second'):
+                    entered.set()
+
+            with profiler.section('first'):
+                thread = threading.Thread(target=other_account)
+                thread.start()
+                # Only one cProfile may be active at a time from Python 3.12;
+                # before that accounts are profiled side by side
+                self.assertEqual(entered.wait(0.5), sys.version_info < (3, 12))
+            thread.join()
+
+            self.assertTrue(entered.is_set())
+            self.assertEqual(
+                sorted(os.path.basename(path) for path in profiler.section_files),
+                ['first.pstats', 'second.pstats'],
+            )
+
+    def test_nested_sections_are_folded_into_the_outer_one(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = RunProfiler(output_dir)
+            with profiler.section('outer'):
+                with profiler.section('inner'):
+                    pass
+            with profiler.section('next'):
+                pass
+
+            self.assertEqual(
+                [os.path.basename(path) for path in profiler.section_files],
+                ['outer.pstats', 'next.pstats'],
+            )
+
+class TestCoalescing(unittest.TestCase):
+    def test_coalesce_invitations(self):
+        invitations = [
+            make_invitation(1, 'John_Doe_Backend_Technical_Assessment'),
+            make_invitation(2, 'Jane_Smith_Frontend_Technical_Assessment'),
+            make_invitation(3, 'john_doe_Backend_Engineer_Technical_Assessment'),
+            make_invitation(4, 'John_Doe_Frontend_Technical_Assessment'),
+            make_invitation(5, 'InvalidRepoName'),
+            make_invitation(6, 'InvalidRepoName'),
+        ]
+
+        groups = [
+            (name, position, [invitation.id for invitation in group])
+            for name, position, group in coalesce_invitations(invitations)
+        ]
+
+        self.assertEqual(
+            groups,
+            [
+                ('John Doe', 'Backend Engineer', [1, 3]),
+                ('Jane Smith', 'Frontend Engineer', [2]),
+                ('John Doe', 'Frontend Engineer', [4]),
+                ('InvalidRepoName', 'POSITION_NOT_FOUND', [5]),
+                ('InvalidRepoName', 'POSITION_NOT_FOUND', [6]),
+            ],
+        )
+
+    def test_only_template_repos_of_the_same_owner_are_coalesced(self):
+        invitations = [
+            make_invitation(1, 'Backend_Take_Home_Alice'),
+            make_invitation(2, 'Backend_Take_Home_Bob'),
+            make_invitation(3, 'Frontend_Technical_Assessment')._replace(
+                repo_full_name='alice/Frontend_Technical_Assessment'
+            ),
+            make_invitation(4, 'Frontend_Technical_Assessment')._replace(
+                repo_full_name='bob/Frontend_Technical_Assessment'
+            ),
+            make_invitation(5, 'John_Doe_Backend_Technical_Assessment')._replace(
+                repo_full_name='alice/John_Doe_Backend_Technical_Assessment'
+            ),
+            make_invitation(6, 'John_Doe_Backend_Technical_Assessment')._replace(
+                repo_full_name='bob/John_Doe_Backend_Technical_Assessment'
+            ),
+        ]
+
+        groups = [
+            [invitation.id for invitation in group]
+            for _, _, group in coalesce_invitations(invitations)
+        ]
+
+        self.assertEqual(groups, [[1], [2], [3], [4], [5], [6]])
+        self.assertEqual(identify_candidate(invitations[0])[2], '1')
+
+    def test_assign_reviewer_is_kept_for_resubmissions(self):
+        reviewers = [f'reviewer-{i}@example.com' for i in range(5)]
+        with closing(connect_state_db(':memory:')) as conn:
+            first = assign_reviewer(conn, 'john doe|Backend Engineer', reviewers, 1)
+            # A later invitation ID would hash elsewhere, but the reviewer sticks
+            for invitation_id in range(2, 20):
+                self.assertEqual(
+                    assign_reviewer(conn, 'john doe|Backend Engineer', reviewers, invitation_id),
+                    first,
+                )
+
+            # Reassigned once the reviewer leaves the roster
+            remaining = [reviewer for reviewer in reviewers if reviewer != first]
+            self.assertIn(
+                assign_reviewer(conn, 'john doe|Backend Engineer', remaining, 1), remaining
+            )
+
+
+class TestWorkQueue(unittest.TestCase):
+    def test_invitation_priority(self):
+        fresh = make_invitation(1, 'John_Doe_Backend_Technical_Assessment')
+        unparseable = make_invitation(2, 'InvalidRepoName')
+        expired = make_invitation(3, 'John_Doe_Backend_Technical_Assessment', expired=True)
+
+        self.assertLess(invitation_priority(fresh), invitation_priority(unparseable))
+        self.assertLess(invitation_priority(unparseable), invitation_priority(expired))
+
+    def test_sync_work_queue_keeps_carried_over_priority(self):
+        first_run = [
+            make_invitation(1, 'John_Doe_Backend_Technical_Assessment'),
+            make_invitation(2, 'InvalidRepoName'),
+        ]
+        with closing(connect_state_db(':memory:')) as conn:
+            queued = sync_work_queue(conn, first_run)
+            self.assertEqual({i: value[0] for i, value in queued.items()}, {1: 0, 2: 1})
+
+            # Invitation 1 turned expired since, but keeps its queue position;
+            # invitation 2 is gone from GitHub and is dropped
+            second_run = [
+                make_invitation(1, 'John_Doe_Backend_Technical_Assessment', expired=True),
+                make_invitation(3, 'Jane_Doe_Frontend_Technical_Assessment'),
+            ]
+            carried = sync_work_queue(conn, second_run)
+            self.assertEqual(carried[1], queued[1])
+            self.assertEqual(carried[3][0], 0)
+            # Carried-over work sorts before work first seen in this run
+            self.assertLess(carried[1], carried[3])
+            self.assertEqual(
+                conn.execute('SELECT invitation_id FROM work_queue ORDER BY 1').fetchall(),
+                [(1,), (3,)],
+            )
+
+    def test_failed_work_goes_after_fresh_work(self):
+        with closing(connect_state_db(':memory:')) as conn:
+            sync_work_queue(conn, [make_invitation(1, 'John_Doe_Backend_Technical_Assessment')])
+            record_failed_attempt(conn, [1])
+
+            queued = sync_work_queue(
+                conn,
+                [
+                    make_invitation(1, 'John_Doe_Backend_Technical_Assessment'),
+                    make_invitation(2, 'Jane_Doe_Frontend_Technical_Assessment'),
+                ],
+            )
+
+        self.assertEqual(queued[1][:2], (0, 1))
+        self.assertLess(queued[2], queued[1])
+
+    def test_sync_work_queue_only_drops_own_shard(self):
+        with closing(connect_state_db(':memory:')) as conn:
+            sync_work_queue(conn, [make_invitation(i, 'InvalidRepoName') for i in range(1, 9)])
+            sync_work_queue(conn, [], shard_index=0, shard_count=2)
+            remaining = [
+                invitation_id
+                for (invitation_id,) in conn.execute('SELECT invitation_id FROM work_queue')
+            ]
+
+        self.assertTrue(remaining)
+        self.assertTrue(all(stable_bucket(i, 2) == 1 for i in remaining))
+
+
+class TestAccounts(unittest.TestCase):
+    def test_load_accounts(self):
+        config = {
+            'accounts': [
+                {'login': 'first', 'token': 'first-token', 'notion_page_id': 'page-1'},
+                {
+                    'login': 'second',
+                    'token_env': 'SECOND_TOKEN',
+                    'roles': {'ml': 'Machine Learning Engineer'},
+                },
+            ]
+        }
+        with tempfile.TemporaryDirectory() as config_dir:
+            path = os.path.join(config_dir, 'accounts.json')
+            with open(path, 'w') as f:
+                json.dump(config, f)
+            with mock.patch.dict('os.environ', {'SECOND_TOKEN': 'second-token'}):
+                first, second = load_accounts(path)
+
+        self.assertEqual((first.login, first.auth.password), ('first', 'first-token'))
+        self.assertEqual(first.notion_page_id, 'page-1')
+        self.assertEqual(second.auth.password, 'second-token')
+        self.assertEqual(
+            extract_candidate_info_from_repo(
+                'Ada_Lovelace_ML_Technical_Assessment', second.role_mapping
+            ),
+            ('Ada Lovelace', 'Machine Learning Engineer'),
+        )
+        self.assertEqual([account.login for account in load_accounts()], ['bowtie-careers'])
+
+    def test_load_accounts_rejects_an_empty_config(self):
+        with tempfile.TemporaryDirectory() as config_dir:
+            path = os.path.join(config_dir, 'accounts.json')
+            with open(path, 'w') as f:
+                json.dump({'accounts': []}, f)
+
+            with self.assertRaisesRegex(ValueError, 'No accounts configured'):
+                load_accounts(path)
+
+    @mock.patch('requests.Session.get')
+    def test_rate_limit_accounting(self, mock_get):
+        mock_get.return_value = mock.Mock(
+            headers={'X-RateLimit-Remaining': '4998', 'X-RateLimit-Reset': '1700000000'}
+        )
+        account = GitHubAccount('someone', 'token')
+        account.request('get', 'https://api.github.com/user/repository_invitations')
+        account.request('get', 'https://api.github.com/user/repository_invitations')
+
+        self.assertEqual(account.requests_made, 2)
+        self.assertEqual(account.rate_limit_remaining, 4998)
+        self.assertEqual(account.rate_limit_reset, 1700000000)
+        self.assertEqual(mock_get.call_args.kwargs['auth'], account.auth)
+
+    def test_single_flight_lookups_run_once(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        @single_flight
+        def lookup(key):
+            calls.append(key)
+            started.set()
+            release.wait(5)
+            return key.upper()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(lookup, 'roster')
+            started.wait(5)
+            # Accounts asking while the first lookup is in flight wait for it
+            others = [executor.submit(lookup, 'roster') for _ in range(3)]
+            release.set()
+            results = [future.result() for future in [first, *others]]
+
+        self.assertEqual(results, ['ROSTER'] * 4)
+        self.assertEqual(calls, ['roster'])
+        lookup.cache_clear()
+        lookup('roster')
+        self.assertEqual(calls, ['roster', 'roster'])
+
+    def test_single_flight_does_not_cache_empty_results(self):
+        lookup = single_flight(mock.Mock(side_effect=[[], ['reviewer@example.com']]))
+
+        self.assertEqual(lookup('backend-db'), [])
+        self.assertEqual(lookup('backend-db'), ['reviewer@example.com'])
+        self.assertEqual(lookup('backend-db'), ['reviewer@example.com'])
+
+    def test_single_flight_does_not_cache_failures(self):
+        lookup = single_flight(mock.Mock(side_effect=[requests.ConnectionError(), 'U12345']))
+
+        with self.assertRaises(requests.ConnectionError):
+            lookup('reviewer@example.com')
+        self.assertEqual(lookup('reviewer@example.com'), 'U12345')
+        self.assertEqual(lookup('reviewer@example.com'), 'U12345')
+
+
+class TestInvitationRecords(unittest.TestCase):
+    def test_from_json_keeps_only_used_fields(self):
+        invitation = Invitation.from_json(
+            {
+                'id': 12345,
+                'expired': False,
+                'created_at': '2023-07-15T12:00:00Z',
+                'url': 'https://api.github.com/user/repository_invitations/12345',
+                'repository': {
+                    'full_name': 'org/John_Doe_Backend_Technical_Assessment',
+                    'html_url': 'https://github.com/org/John_Doe_Backend_Technical_Assessment',
+                    'owner': {'login': 'org'},
+                },
+                'inviter': {'login': 'john'},
+                'invitee': {'login': 'bowtie-careers'},
+            }
+        )
+
+        self.assertEqual(invitation.id, 12345)
+        self.assertEqual(invitation.repo_name, 'John_Doe_Backend_Technical_Assessment')
+        self.assertEqual(len(invitation), 6)
+
+    def test_from_json_requires_created_at(self):
+        # The queue and the latency report both rely on it
+        with self.assertRaises(KeyError):
+            Invitation.from_json(
+                {
+                    'id': 12345,
+                    'expired': False,
+                    'url': 'https://api.github.com/user/repository_invitations/12345',
+                    'repository': {'full_name': 'org/John_Doe_Backend_Technical_Assessment'},
+                }
+            )
+
+    @mock.patch('requests.Session.get')
+    def test_iter_invitations_streams_pages(self, mock_get):
+        def page_of(*invitation_ids):
+            return mock.Mock(
+                headers={},
+                json=lambda: [
+                    {
+                        'id': invitation_id,
+                        'expired': False,
+                        'created_at': '2023-07-15T12:00:00Z',
+                        'url': f'url-{invitation_id}',
+                        'repository': {'full_name': f'org/repo-{invitation_id}'},
+                    }
+                    for invitation_id in invitation_ids
+                ],
+            )
+
+        mock_get.side_effect = [page_of(1, 2), page_of(3, 4), page_of(5)]
+        stream = iter_invitations(GitHubAccount('someone', 'token'), per_page=2)
+
+        # Nothing is fetched until the stream is consumed
+        self.assertEqual(mock_get.call_count, 0)
+        self.assertEqual(next(stream).id, 1)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual([invitation.id for invitation in stream], [2, 3, 4, 5])
+        self.assertEqual(
+            [call.kwargs['params']['page'] for call in mock_get.call_args_list], [1, 2, 3]
+        )